@@ -1,103 +1,336 @@
-import os
-
-import time
-
-from pinecone import Pinecone, ServerlessSpec
-
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, CSVLoader
-from dotenv import load_dotenv
-import logging
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from fastapi import FastAPI
-
-load_dotenv()
-
-logger = logging.getLogger(__name__)
-
-class DocumentProcessor:
-    def __init__(self, chunk_size=1000, chunk_overlap=0):
-        self.index_name = os.getenv("INDEX_NAME")
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
-        self.pinecone_client = Pinecone(api_key=self.pinecone_api_key)
-        self.path=os.getenv("DATA_DIR_PATH")
-        self.pinecone_index = None
-        self.docsearch = None
-    
-    def initialize_pinecone(self):
-        pc = self.pinecone_client
-        if self.index_name in pc.list_indexes().names():
-            index = pc.Index(self.index_name)
-            print("Index already exists:", self.index_name)
-            print(index.describe_index_stats())
-        else:
-            pc.create_index(
-                name=self.index_name,
-                dimension=1536,  # Replace with your model dimensions
-                metric="cosine",  # Replace with your model metric
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-            while not pc.describe_index(self.index_name).status["ready"]:
-                time.sleep(1)
-            index = pc.Index(self.index_name)
-            print("Index created:", self.index_name)
-        return index
-
-   
-
-    def process_documents(self, directory_path):
-        pdf_loader = DirectoryLoader(
-            path=directory_path,
-            glob="**/*.pdf",
-            loader_cls=PyPDFLoader
-        )
-        pdf_docs = pdf_loader.load()
-
-        csv_loader = DirectoryLoader(
-            path=directory_path,
-            glob="**/*.csv",
-            loader_cls=CSVLoader
-        )
-        csv_docs = csv_loader.load()
-
-        docs = pdf_docs + csv_docs
-        for doc in docs:
-            filename = doc.metadata.get('source', '').split("\\")[-1]
-            doc.metadata.update({"filename": filename})
-
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap
-        )
-        documents = text_splitter.split_documents(docs)
-
-        return documents
-
-    def create_or_load_vectorstore(self, documents, docs_already_in_pinecone):
-        self.initialize_pinecone()  # Ensure Pinecone is initialized
-
-        if docs_already_in_pinecone.lower() == "y":
-            docsearch = PineconeVectorStore(index_name=self.index_name, embedding=self.embeddings)
-            print("Existing Vectorstore is loaded")
-        elif docs_already_in_pinecone.lower() == "n":
-            docsearch = PineconeVectorStore.from_documents(documents, self.embeddings, index_name=self.index_name)
-            print("New vectorstore is created and loaded")
-        else:
-            raise ValueError("Please type 'Y' for yes or 'N' for no")
-        # self.docsearch = docsearch
-        return docsearch
-
-    
-    def retrieve_and_extract(self,user_query, path=""):
-        docs = self.process_documents(self.path)
-        docsearch = self.create_or_load_vectorstore(docs, "y")
-
-
-        retriver = docsearch.as_retriever()
-        return retriver.invoke(user_query)
-    
-
+import os
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from answer_cache import answer_cache
+from clients import get_pinecone
+from embedding_service import get_embedding_service
+from dotenv import load_dotenv
+import logging
+from local_vectorstore import LocalVectorStore
+from hybrid_retriever import BM25Index, HybridRetriever, chunk_key
+from manifest import IngestionManifest, chunk_ids_for, scan_directory
+from metrics import timed
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def load_and_split_file(path, chunk_size, chunk_overlap):
+    # Module-level so it can run in a worker process.
+    from langchain_community.document_loaders import PyPDFLoader, CSVLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    if path.lower().endswith(".pdf"):
+        docs = PyPDFLoader(path).load()
+    else:
+        docs = CSVLoader(path).load()
+    for doc in docs:
+        filename = doc.metadata.get('source', '').replace("\\", "/").split("/")[-1]
+        doc.metadata.update({"filename": filename})
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return text_splitter.split_documents(docs)
+
+
+class DocumentProcessor:
+    def __init__(self, chunk_size=1000, chunk_overlap=0):
+        self.index_name = os.getenv("INDEX_NAME")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
+        self.embeddings = get_embedding_service()
+        # "pinecone" (default) or "local" for the in-process NumPy index
+        self.vector_backend = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+        self.path=os.getenv("DATA_DIR_PATH")
+        self.pinecone_index = None
+        self.docsearch = None
+        self.retriever = None
+        self.bm25_index = None
+        self._vectorstore_lock = threading.Lock()
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+        self.ingest_batch_size = int(os.getenv("INGEST_BATCH_SIZE", 100))
+    
+    @property
+    def pinecone_client(self):
+        # Shared across processors and only created for the pinecone backend
+        return get_pinecone() if self.vector_backend == "pinecone" else None
+
+    def initialize_pinecone(self):
+        from pinecone import ServerlessSpec
+
+        pc = self.pinecone_client
+        if self.index_name in pc.list_indexes().names():
+            index = pc.Index(self.index_name)
+            print("Index already exists:", self.index_name)
+            print(index.describe_index_stats())
+        else:
+            pc.create_index(
+                name=self.index_name,
+                dimension=1536,  # Replace with your model dimensions
+                metric="cosine",  # Replace with your model metric
+                spec=ServerlessSpec(cloud="aws", region="us-east-1")
+            )
+            while not pc.describe_index(self.index_name).status["ready"]:
+                time.sleep(1)
+            index = pc.Index(self.index_name)
+            print("Index created:", self.index_name)
+        return index
+
+   
+
+    def process_documents(self, directory_path):
+        return list(self.iter_chunks(directory_path))
+
+    def iter_chunks(self, directory_path):
+        files = scan_directory(directory_path)
+        jobs = [(relpath, path, None) for relpath, path in sorted(files.items())]
+        for _, _, _, documents in self.iter_split_files(jobs):
+            yield from documents
+
+    def iter_split_files(self, jobs, max_in_flight=None):
+        """Parse and split files across a process pool.
+
+        Yields (relpath, path, file_hash, documents) per file in completion
+        order. At most max_in_flight files are parsed or buffered at once, so
+        memory stays bounded by a handful of files rather than the corpus.
+        """
+        max_in_flight = max_in_flight or 2 * self.ingest_workers
+        jobs = iter(jobs)
+        with ProcessPoolExecutor(max_workers=self.ingest_workers) as executor:
+            in_flight = {}
+            while True:
+                for relpath, path, file_hash in jobs:
+                    future = executor.submit(load_and_split_file, path, self.chunk_size, self.chunk_overlap)
+                    in_flight[future] = (relpath, path, file_hash)
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relpath, path, file_hash = in_flight.pop(future)
+                    try:
+                        documents = future.result()
+                    except Exception as e:
+                        logger.error(f"Error loading {relpath}: {e}")
+                        continue
+                    yield relpath, path, file_hash, documents
+
+    def get_vectorstore(self):
+        # The index handle and vector store are built once per process; the
+        # control-plane calls in initialize_pinecone only run during ingestion.
+        # A local store reloads itself once another process persists a newer
+        # one (the retriever refreshes it before each search).
+        if self.docsearch is None:
+            with self._vectorstore_lock:
+                if self.docsearch is None:
+                    if self.vector_backend == "local":
+                        self.docsearch = LocalVectorStore.load(self.embeddings)
+                    else:
+                        from langchain_pinecone import PineconeVectorStore
+
+                        if self.pinecone_index is None:
+                            self.pinecone_index = self.pinecone_client.Index(self.index_name)
+                        self.docsearch = PineconeVectorStore(index=self.pinecone_index, embedding=self.embeddings)
+                    self.retriever = HybridRetriever(self.docsearch, self.get_bm25_index())
+                    print("Existing Vectorstore is loaded")
+        return self.docsearch
+
+    def get_bm25_index(self):
+        if self.bm25_index is None:
+            self.bm25_index = BM25Index.load()
+        return self.bm25_index
+
+    def warm_up(self):
+        # Opens the data-plane connection and caches the warm-up embedding so
+        # the first real query does not pay for either.
+        start_time = time.time()
+        self.get_vectorstore().similarity_search("warm up", k=1)
+        logger.info(f"Vector store warmed up in {(time.time() - start_time) * 1000:.0f} ms")
+
+    def create_or_load_vectorstore(self, documents, docs_already_in_pinecone):
+        if docs_already_in_pinecone.lower() == "y":
+            docsearch = self.get_vectorstore()
+        elif docs_already_in_pinecone.lower() == "n" and self.vector_backend == "local":
+            docsearch = LocalVectorStore.from_documents(documents, self.embeddings)
+            docsearch.persist()
+            self.rebuild_bm25_index(documents)
+            print("New vectorstore is created and loaded")
+        elif docs_already_in_pinecone.lower() == "n":
+            from langchain_pinecone import PineconeVectorStore
+
+            self.pinecone_index = self.initialize_pinecone()  # Ensure Pinecone is initialized
+            docsearch = PineconeVectorStore.from_documents(documents, self.embeddings, index_name=self.index_name)
+            self.rebuild_bm25_index(documents)
+            print("New vectorstore is created and loaded")
+        else:
+            raise ValueError("Please type 'Y' for yes or 'N' for no")
+        return docsearch
+
+    
+    def rebuild_bm25_index(self, documents):
+        bm25_index = self.get_bm25_index()
+        bm25_index.add_documents(documents, [chunk_key(doc) for doc in documents])
+        bm25_index.save()
+
+    def split_file(self, path):
+        return load_and_split_file(path, self.chunk_size, self.chunk_overlap)
+
+    def vector_target(self):
+        # Where ingested chunks live; the manifest is only valid for this store.
+        if self.vector_backend == "local":
+            return {"backend": "local", "index": os.path.abspath(os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store"))}
+        return {"backend": self.vector_backend, "index": self.index_name}
+
+    def vector_store_empty(self, docsearch):
+        if isinstance(docsearch, LocalVectorStore):
+            return docsearch.live_count() == 0
+        stats = self.pinecone_index.describe_index_stats()
+        total = stats.get("total_vector_count") if isinstance(stats, dict) else getattr(stats, "total_vector_count", None)
+        return total == 0
+
+    def backfill_bm25_index(self, jobs, manifest, bm25_index):
+        """Add already embedded files to the BM25 index without embedding them again.
+
+        Returns the jobs whose chunks no longer match the manifest (e.g. the
+        chunk size changed since they were embedded); those need a full ingest.
+        """
+        reingest = []
+        for relpath, path, file_hash, documents in self.iter_split_files(jobs):
+            ids = chunk_ids_for(relpath, file_hash, len(documents))
+            if ids != manifest.chunk_ids(relpath):
+                reingest.append((relpath, path, file_hash))
+                continue
+            for doc, chunk_id in zip(documents, ids):
+                doc.metadata.update({"chunk_id": chunk_id, "file_hash": file_hash})
+            bm25_index.add_documents(documents, ids)
+        logger.info(f"Backfilled the BM25 index from {len(jobs) - len(reingest)} ingested files")
+        return reingest
+
+    def ingest_documents(self, directory_path=None, manifest=None, rebuild_bm25=False):
+        # Loading and splitting the corpus is an explicit, offline step; the
+        # query path below only ever talks to the existing vector store.
+        # Only files that were added or changed since the last run are loaded,
+        # split and embedded; chunks of modified or deleted files are removed.
+        directory_path = directory_path or self.path
+        if self.vector_backend == "pinecone":
+            self.pinecone_index = self.initialize_pinecone()  # Ensure Pinecone is initialized
+        docsearch = self.get_vectorstore()
+        bm25_index = self.get_bm25_index()
+        if rebuild_bm25:
+            bm25_index.clear()
+
+        manifest = manifest or IngestionManifest(target=self.vector_target())
+        if manifest.files and self.vector_store_empty(docsearch):
+            # The store was lost or recreated; none of the recorded chunks exist.
+            logger.warning("Vector store is empty but the manifest lists ingested files; ingesting every file again")
+            manifest.reset()
+        files = scan_directory(directory_path)
+        changed, unchanged, deleted = manifest.diff(files)
+        # Unchanged files whose chunks are missing from the BM25 index (a lost
+        # or older pickle) are re-split and indexed lexically only.
+        backfill = [(relpath, files[relpath], manifest.files[relpath]["hash"]) for relpath in unchanged
+                    if any(chunk_id not in bm25_index for chunk_id in manifest.chunk_ids(relpath))]
+        logger.info(f"Ingestion plan for {directory_path}: {len(changed)} changed, "
+                    f"{len(unchanged)} unchanged ({len(backfill)} missing from BM25), {len(deleted)} deleted")
+        pending = {}
+        batch = []
+
+        def finish_file(relpath):
+            path, file_hash, ids = pending.pop(relpath)
+            # New chunks are upserted before the old ones are dropped so the
+            # file never disappears from search results mid-ingestion.
+            new_ids = set(ids)
+            stale_ids = [i for i in manifest.chunk_ids(relpath) if i not in new_ids]
+            if stale_ids:
+                docsearch.delete(ids=stale_ids)
+                bm25_index.delete(stale_ids)
+            manifest.record(relpath, path, file_hash, ids)
+            logger.info(f"Indexed {relpath}: {len(ids)} chunks")
+
+        def flush():
+            # Chunks are embedded and upserted in fixed-size batches; a file is
+            # recorded in the manifest once the batch holding its last chunk lands.
+            with timed("ingest.embed_upsert"):
+                docsearch.add_documents([doc for doc, _, _ in batch], ids=[i for _, i, _ in batch])
+            with timed("ingest.bm25"):
+                bm25_index.add_documents([doc for doc, _, _ in batch], [i for _, i, _ in batch])
+            completed = [relpath for _, chunk_id, relpath in batch if pending[relpath][2][-1] == chunk_id]
+            batch.clear()
+            for relpath in completed:
+                finish_file(relpath)
+
+        try:
+            if backfill:
+                with timed("ingest.bm25"):
+                    changed += self.backfill_bm25_index(backfill, manifest, bm25_index)
+
+            for relpath, path, file_hash, documents in self.iter_split_files(changed):
+                ids = chunk_ids_for(relpath, file_hash, len(documents))
+                pending[relpath] = (path, file_hash, ids)
+                if not documents:
+                    finish_file(relpath)
+                    continue
+
+                for doc, chunk_id in zip(documents, ids):
+                    doc.metadata.update({"chunk_id": chunk_id, "file_hash": file_hash})
+                    batch.append((doc, chunk_id, relpath))
+                    if len(batch) >= self.ingest_batch_size:
+                        flush()
+            if batch:
+                flush()
+
+            for relpath in deleted:
+                stale_ids = manifest.remove(relpath)
+                if stale_ids:
+                    docsearch.delete(ids=stale_ids)
+                    bm25_index.delete(stale_ids)
+                logger.info(f"Removed {relpath}: {len(stale_ids)} chunks")
+        finally:
+            if isinstance(docsearch, LocalVectorStore):
+                docsearch.persist()
+            bm25_index.save()
+            manifest.save()
+            # Other processes notice the new manifest version; this one can
+            # drop its answers right away.
+            answer_cache.invalidate()
+
+        return docsearch
+
+    def retrieve_and_extract(self,user_query, path=""):
+        self.get_vectorstore()
+        with timed("vector.retrieval"):
+            return self.retriever.invoke(user_query)
+
+    async def aretrieve_and_extract(self, user_query, path=""):
+        if self.retriever is None:
+            await asyncio.to_thread(self.get_vectorstore)
+        with timed("vector.retrieval"):
+            return await self.retriever.ainvoke(user_query)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Load, split and index documents into the vector store.")
+    parser.add_argument("--ingest", nargs="?", const="", metavar="PATH",
+                        help="Ingest documents from PATH (defaults to DATA_DIR_PATH)")
+    parser.add_argument("--rebuild-bm25", action="store_true",
+                        help="Rebuild the BM25 index from every ingested file while ingesting")
+    args = parser.parse_args()
+
+    if args.ingest is None:
+        parser.print_help()
+    else:
+        DocumentProcessor().ingest_documents(args.ingest or None, rebuild_bm25=args.rebuild_bm25)
+
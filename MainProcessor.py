@@ -1,115 +1,617 @@
-# main.py
-
-import os
-from dotenv import load_dotenv
-import logging
-import json
-from QueryProcessor import QueryProcessor
-from DocumentProcessor import DocumentProcessor
-from PostgreSQLProcessor import PostgreSQLProcessor
-from concurrent.futures import ThreadPoolExecutor
-from langchain_community.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from decimal import Decimal
-from flask import Flask,render_template, request, jsonify, abort, send_file
-from flask_cors import CORS
-import time
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-app = Flask(__name__)
-CORS(app)
-
-# Load environment variables
-load_dotenv()
-
-class MainProcessor:
-    def __init__(self):
-        self.query_processor = QueryProcessor()
-        self.document_processor = DocumentProcessor()
-        self.postgresql_processor = PostgreSQLProcessor()
-
-        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=os.getenv("OPENAI_API_KEY"))
-        
-        self.summary_prompt_template = """
-        User Query: {user_query}
-
-        SQL Database Results:
-        {sql_results}
-
-        Vector Database Results:
-        {vector_results}
-
-        Please provide a concise summary of the information above that addresses the user's query.
-        Your summary should be in clear and natural language that is easy for the user to understand.
-        """
-
-        self.llm_chain_summary = LLMChain(
-            prompt=PromptTemplate(input_variables=["user_query", "sql_results", "vector_results"], template=self.summary_prompt_template),
-            llm=self.llm
-        )
-
-    @staticmethod
-    def default_serializer(obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
-
-    def fetch_results(self, user_prompt):
-        with ThreadPoolExecutor() as executor:
-            sql_future = executor.submit(self.query_processor.generate_and_execute_sql_query, user_prompt)
-            vector_future = executor.submit(self.document_processor.retrieve_and_extract, user_prompt)
-            postgresql_future = executor.submit(self.postgresql_processor.generate_and_execute_sql_query, user_prompt)
-
-            sql_results = sql_future.result()
-            vector_results = vector_future.result()
-            postgresql_results = postgresql_future.result()
-
-        return sql_results, vector_results, postgresql_results
-    
-    def process_query(self, user_prompt):
-        try:
-            sql_results, vector_results, postgresql_results = self.fetch_results(user_prompt)
-
-            summary = self.llm_chain_summary.run({
-                "user_query": user_prompt,
-                "sql_results": json.dumps(sql_results, default=MainProcessor.default_serializer, indent=2),
-                "vector_results": str(vector_results),
-                "postgresql_results": json.dumps(postgresql_results, default=MainProcessor.default_serializer, indent=2)
-            })
-
-            return summary
-
-        except Exception as e:
-            logger.error(f"Error processing query: {e}")
-            abort(500, description=f"An error occurred: {str(e)}")
-
-processor = MainProcessor()
-
-@app.route("/")
-def index():
-    app.logger.info("Index route accessed")
-    return render_template("index.html")
-
-@app.route("/query", methods=["POST"])
-def process_query_route():
-    try:
-        start_time = time.time()
-        data = request.json
-        user_prompt = data.get("prompt", "")
-        result = processor.process_query(user_prompt)
-        end_time = time.time()
-        processing_time = (end_time - start_time) * 1000  # Convert to milliseconds
-        return jsonify({
-            "result": result,
-            "processing_time_ms": round(processing_time, 2)
-        })
-    except Exception as e:
-        logger.error(f"Error in /query route: {e}")
-        return jsonify({"error": str(e)}), 500
-
-if __name__ == "__main__":
+# main.py
+
+import time
+_import_start = time.perf_counter()
+
+import os
+import asyncio
+import contextvars
+from dotenv import load_dotenv
+import logging
+import json
+from concurrent.futures import FIRST_COMPLETED, wait
+from clients import (get_document_processor, get_llm, get_postgresql_processor, get_query_processor,
+                     get_source_executor, peek_client, record_startup, source_budget_ms, startup_report)
+from answer_cache import answer_cache
+from manifest import current_version
+from context_assembler import ContextAssembler
+from result_fetch import default_serializer, empty_result
+from query_router import QueryRouter
+from db_pool import call_by, caller_deadline, pool_stats
+from sql_guard import QueryCostExceeded, StatementTimeout
+from metrics import REGISTRY, REQUESTS, estimate_tokens, observe_stage, record_tokens, request_scope, timed
+from flask import Flask,render_template, request, jsonify, abort, send_file, Response, stream_with_context
+from flask_cors import CORS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKENS = REGISTRY.counter("datamind_summary_context_tokens_total",
+                                  "Tokens of source context sent to the summary prompt")
+SOURCE_OUTCOMES = REGISTRY.counter("datamind_source_outcomes_total",
+                                   "Source calls by outcome: ok, timed_out, rejected or failed")
+
+UNKNOWN_VERSION = "unknown"
+
+app = Flask(__name__)
+CORS(app)
+
+# Load environment variables
+load_dotenv()
+
+class MainProcessor:
+    def __init__(self):
+        # Processors, the LLM and their imports are created on first use (or
+        # in warm_up) through the shared client registry, so importing this
+        # module stays cheap for pre-forked workers.
+        self.router = QueryRouter()
+        # Renders each source compactly within its token budget
+        self.context_assembler = ContextAssembler()
+        self._summary_prompt = None
+
+        # Latency budget per source and overall request deadline. The last
+        # summary budget of the deadline is kept for the summary: routing and
+        # the source fan-out must be done before it, and a source that misses
+        # its budget or that point is answered without.
+        self.source_budgets_ms = {source: source_budget_ms(source) for source in ("mysql", "postgresql", "vector")}
+        self.deadline_ms = float(os.getenv("QUERY_DEADLINE_MS", 20000))
+        self.summary_budget_ms = source_budget_ms("summary")
+
+        self.summary_prompt_template = """
+        User Query: {user_query}
+
+        MySQL Database Results:
+        {sql_results}
+
+        PostgreSQL Database Results:
+        {postgresql_results}
+
+        Vector Database Results:
+        {vector_results}
+
+        Please provide a concise summary of the information above that addresses the user's query.
+        Your summary should be in clear and natural language that is easy for the user to understand.
+        """
+
+        # Cache and pool figures are read from their owners on every scrape
+        REGISTRY.register_collector(self.metrics_samples)
+
+    default_serializer = staticmethod(default_serializer)
+
+    @property
+    def query_processor(self):
+        return get_query_processor()
+
+    @property
+    def document_processor(self):
+        return get_document_processor()
+
+    @property
+    def postgresql_processor(self):
+        return get_postgresql_processor()
+
+    @property
+    def llm(self):
+        return get_llm()
+
+    @property
+    def summary_prompt(self):
+        if self._summary_prompt is None:
+            from langchain.prompts import PromptTemplate
+            self._summary_prompt = PromptTemplate(
+                input_variables=["user_query", "sql_results", "postgresql_results", "vector_results"],
+                template=self.summary_prompt_template
+            )
+        return self._summary_prompt
+
+    def metrics_samples(self):
+        # Only report on components that exist; a scrape must not create them.
+        embeddings = peek_client("embeddings")
+        caches = {"embedding": embeddings.stats()} if embeddings else {}
+        for source, name in (("mysql", "query_processor"), ("postgresql", "postgresql_processor")):
+            sql_processor = peek_client(name)
+            if sql_processor is None:
+                continue
+            caches[f"sql_{source}"] = sql_processor.sql_cache.stats()
+            pruner = sql_processor.schema_pruner.stats()
+            yield ("datamind_schema_prompt_tokens_avg", "gauge", "Average schema prompt tokens before/after pruning",
+                   {"source": source, "phase": "before"}, pruner["avg_tokens_before"])
+            yield ("datamind_schema_prompt_tokens_avg", "gauge", "Average schema prompt tokens before/after pruning",
+                   {"source": source, "phase": "after"}, pruner["avg_tokens_after"])
+        caches["answer"] = answer_cache.stats()
+        for outcome in ("hits", "coalesced", "misses"):
+            yield ("datamind_answer_cache_requests", "gauge", "Answer cache lookups by outcome since start",
+                   {"outcome": outcome}, caches["answer"][outcome])
+        for cache, stats in caches.items():
+            yield ("datamind_cache_hit_ratio", "gauge", "Cache hit ratio since start", {"cache": cache},
+                   stats["hit_ratio"])
+        for pool, stats in pool_stats().items():
+            for key in ("max_size", "in_use", "idle", "size"):
+                if key in stats:
+                    yield ("datamind_db_pool_connections", "gauge", "Connection pool sizes by state",
+                           {"pool": pool, "state": key}, stats[key])
+
+    def warm_up(self):
+        # Builds the shared clients and opens the vector store and DB pools
+        # in this worker, so its first query does not pay for them.
+        start_time = time.perf_counter()
+        steps = {
+            "summary_llm": lambda: (self.llm, self.summary_prompt),
+            "vector_store": lambda: self.document_processor.warm_up(),
+            "schemas": lambda: self.route("warm up"),
+        }
+        for name, step in steps.items():
+            try:
+                step()
+            except Exception as e:
+                logger.warning(f"Warm-up step {name} failed, first query will initialise lazily: {e}")
+        record_startup("warm_up", (time.perf_counter() - start_time) * 1000)
+        logger.info(f"Startup report (ms): {startup_report()}")
+
+    def data_versions(self):
+        # Markers that change with the data behind an answer; part of the
+        # answer cache key. Only the cached schema fingerprints are read: a
+        # request must not wait on, or fail with, schema introspection before
+        # the cache lookup. A marker that cannot be read is "unknown", and
+        # answers keyed with it are not cached.
+        from schema import get_mysql_schema_fingerprint
+        from postgresql import get_postgres_schema_fingerprint
+
+        markers = {
+            "mysql": lambda: get_mysql_schema_fingerprint(self.query_processor.mysql_db_config),
+            "postgresql": lambda: get_postgres_schema_fingerprint(self.postgresql_processor.postgresql_db_config),
+        }
+        versions = {}
+        for name, marker in markers.items():
+            try:
+                versions[name] = marker() or UNKNOWN_VERSION
+            except Exception as e:
+                logger.warning(f"Could not read the {name} data version: {e}")
+                versions[name] = UNKNOWN_VERSION
+        try:
+            versions["documents"] = current_version()
+        except Exception as e:
+            logger.warning(f"Could not read the documents data version: {e}")
+            versions["documents"] = UNKNOWN_VERSION
+        return versions
+
+    def route(self, user_prompt, statuses=None):
+        from schema import get_mysql_schema
+        from postgresql import get_postgres_schema
+
+        # Table/column names come from the (cached) schema introspection. A
+        # backend whose schema cannot be read is routed around and reported
+        # as failed, so the answer is not cached.
+        lookups = {
+            "mysql": lambda: get_mysql_schema(self.query_processor.mysql_db_config),
+            "postgresql": lambda: get_postgres_schema(self.postgresql_processor.postgresql_db_config),
+        }
+        schema_terms = {}
+        for source, lookup in lookups.items():
+            try:
+                _, tables, columns = lookup()
+            except Exception as e:
+                logger.warning(f"Schema lookup for {source} failed, routing without it: {e}")
+                tables, columns = set(), set()
+                if statuses is not None:
+                    statuses[source] = "failed"
+            schema_terms[source] = (tables, columns)
+        return self.router.route(user_prompt, schema_terms, self.document_processor.get_bm25_index())
+
+    def source_calls(self):
+        return {
+            "mysql": self.query_processor.generate_and_execute_sql_query,
+            "vector": self.document_processor.retrieve_and_extract,
+            "postgresql": self.postgresql_processor.generate_and_execute_sql_query,
+        }
+
+    def async_source_calls(self):
+        return {
+            "mysql": self.query_processor.agenerate_and_execute_sql_query,
+            "vector": self.document_processor.aretrieve_and_extract,
+            "postgresql": self.postgresql_processor.agenerate_and_execute_sql_query,
+        }
+
+    @staticmethod
+    def empty_results():
+        return {"mysql": empty_result(), "vector": [], "postgresql": empty_result()}
+
+    def source_deadlines(self, sources, start, deadline=None):
+        # Each source is due at the end of its budget or when the fan-out must
+        # end, whichever is first
+        deadline = deadline or start + (self.deadline_ms - self.summary_budget_ms) / 1000
+        return {source: min(start + self.source_budgets_ms[source] / 1000, deadline) for source in sources}
+
+    def source_outcome(self, source, future, start):
+        """(source, result, elapsed_ms, status) for a finished or overdue future."""
+        elapsed_ms = round((time.monotonic() - start) * 1000, 2)
+        status, result = "ok", self.empty_results()[source]
+        if not future.done():
+            # A queued call is dropped and an async task cancelled; a call
+            # already running on a thread finishes in the background (bounded
+            # by the statement and LLM timeouts) and its result is ignored.
+            future.cancel()
+            status = "timed_out"
+            logger.warning(f"Source {source} missed its deadline after {elapsed_ms} ms; answering without it")
+        else:
+            try:
+                result = future.result()
+            except StatementTimeout as e:
+                status = "timed_out"
+                logger.warning(f"Source {source} timed out: {e}")
+            except QueryCostExceeded as e:
+                status = "rejected"
+                logger.warning(f"Source {source} skipped: {e}")
+            except Exception as e:
+                # One broken source (bad generated SQL, exhausted pool, lost
+                # connection) must not fail the answer from the others.
+                status = "failed"
+                logger.error(f"Source {source} failed: {e}")
+        observe_stage(source, elapsed_ms)
+        SOURCE_OUTCOMES.inc(source=source, status=status)
+        return source, result, elapsed_ms, status
+
+    @staticmethod
+    def next_due(pending, due):
+        """Seconds until the first of the pending calls is due."""
+        return max(min(due[call] for call in pending) - time.monotonic(), 0)
+
+    @staticmethod
+    def finished_calls(done, pending, due):
+        """The pending calls that finished or are overdue."""
+        now = time.monotonic()
+        return done | {call for call in pending if due[call] <= now}
+
+    def iter_source_results(self, user_prompt, routing, deadline=None):
+        """Yield (source, result, elapsed_ms, status) for the selected sources as
+        each one finishes or runs out of time.
+
+        status is "ok", "timed_out" (the source missed its budget, the request
+        deadline or its statement timeout), "rejected" (the SQL cost guard
+        refused the query) or "failed" (the source raised an error); all but
+        "ok" come with an empty result.
+        """
+        calls = self.source_calls()
+        start = time.monotonic()
+        deadlines = self.source_deadlines([source for source in calls if routing[source]["selected"]], start,
+                                          deadline)
+        # Each call runs in a copy of the request context so its stage
+        # timings land in the same per-request breakdown, and its pool
+        # checkouts wait no longer than the source is given.
+        futures = {
+            get_source_executor().submit(contextvars.copy_context().run, call_by, deadlines[source], calls[source],
+                                         user_prompt): source
+            for source in deadlines
+        }
+        due = {future: deadlines[source] for future, source in futures.items()}
+        pending = set(futures)
+        while pending:
+            done, _ = wait(pending, timeout=self.next_due(pending, due), return_when=FIRST_COMPLETED)
+            finished = self.finished_calls(done, pending, due)
+            pending -= finished
+            for future in finished:
+                yield self.source_outcome(futures[future], future, start)
+
+    async def aiter_source_results(self, user_prompt, routing, deadline=None):
+        calls = self.async_source_calls()
+        start = time.monotonic()
+        deadlines = self.source_deadlines([source for source in calls if routing[source]["selected"]], start,
+                                          deadline)
+        # The selected sources run concurrently on the event loop, no threads
+        # per request; a task still waiting for a connection at its deadline
+        # is cancelled.
+        tasks = {asyncio.ensure_future(calls[source](user_prompt)): source for source in deadlines}
+        due = {task: deadlines[source] for task, source in tasks.items()}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self.next_due(pending, due),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                finished = self.finished_calls(done, pending, due)
+                pending -= finished
+                for task in finished:
+                    yield self.source_outcome(tasks[task], task, start)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def fetch_results(self, user_prompt, routing=None, timings=None, statuses=None, deadline=None):
+        routing = routing or self.route(user_prompt, statuses)
+        results = self.empty_results()
+        for source, result, elapsed_ms, status in self.iter_source_results(user_prompt, routing, deadline):
+            results[source] = result
+            if timings is not None:
+                timings[source] = elapsed_ms
+            if statuses is not None:
+                statuses[source] = status
+        return results["mysql"], results["vector"], results["postgresql"]
+
+    @staticmethod
+    def complete(statuses, versions=None):
+        # Answers built without a timed-out or failed source, or against a
+        # data version that could not be read, are not cached; the next
+        # request may well get that source.
+        return not {"timed_out", "failed"} & set(statuses.values()) and \
+            UNKNOWN_VERSION not in (versions or {}).values()
+
+    def summary_inputs(self, user_prompt, sql_results, vector_results, postgresql_results, details=None,
+                       statuses=None):
+        inputs, accounting = self.context_assembler.assemble(user_prompt, sql_results, vector_results,
+                                                             postgresql_results, statuses)
+        accounting["prompt"] = estimate_tokens(self.summary_prompt.format(**inputs))
+        for source in ("mysql", "postgresql", "vector"):
+            CONTEXT_TOKENS.inc(accounting[source]["tokens"], source=source)
+        if details is not None:
+            details["context_tokens"] = accounting
+        return inputs
+
+    def answer_events(self, run):
+        """Route, fan out and summarise for run, yielding its routing, progress
+        and token events."""
+        with timed("routing", run.timings), caller_deadline(run.sources_deadline):
+            routing = self.route(run.user_prompt, run.statuses)
+        yield run.routing_event(routing)
+        for outcome in self.iter_source_results(run.user_prompt, routing, run.sources_deadline):
+            yield run.source_event(*outcome)
+        for chunk in self.llm.stream(run.summary_prompt()):
+            run.check_deadline()
+            event = run.token_event(chunk.content)
+            if event:
+                yield event
+        run.summary_done()
+
+    async def aanswer_events(self, run):
+        with timed("routing", run.timings), caller_deadline(run.sources_deadline):
+            routing = await asyncio.to_thread(self.route, run.user_prompt, run.statuses)
+        yield run.routing_event(routing)
+        async for outcome in self.aiter_source_results(run.user_prompt, routing, run.sources_deadline):
+            yield run.source_event(*outcome)
+        async for chunk in self.llm.astream(run.summary_prompt()):
+            run.check_deadline()
+            event = run.token_event(chunk.content)
+            if event:
+                yield event
+        run.summary_done()
+
+    def query_events(self, run):
+        """The events of one answer: served from the answer cache, shared with
+        an identical request in flight, or computed here."""
+        try:
+            status, value = run.claim(self.data_versions())
+            if status == "coalesced":
+                value = value.result(timeout=run.remaining())
+            if status != "miss":
+                yield from run.shared_events(value)
+                return
+            yield from self.answer_events(run)
+            yield run.finish()
+        except Exception as e:
+            yield run.error_event(e)
+        finally:
+            run.abandon()
+
+    async def aquery_events(self, run):
+        try:
+            status, value = run.claim(await asyncio.to_thread(self.data_versions))
+            if status == "coalesced":
+                # Shielded: giving up must not cancel the answer the others share
+                value = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(value)), run.remaining())
+            if status != "miss":
+                for event in run.shared_events(value):
+                    yield event
+                return
+            async for event in self.aanswer_events(run):
+                yield event
+            yield run.finish()
+        except Exception as e:
+            yield run.error_event(e)
+        finally:
+            run.abandon()
+
+    def process_query(self, user_prompt, timings=None, details=None):
+        try:
+            run = QueryRun(self, user_prompt, timings, details)
+            return run.collect(self.query_events(run))
+
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            abort(500, description=f"An error occurred: {str(e)}")
+
+    async def aprocess_query(self, user_prompt, timings=None, details=None):
+        run = QueryRun(self, user_prompt, timings, details)
+        return run.collect([event async for event in self.aquery_events(run)])
+
+    def stream_query(self, user_prompt):
+        """Yield SSE-style events: routing, one progress event per finished
+        source, summary tokens as the LLM produces them, then done. A cached
+        or shared answer comes as a single token event."""
+        return self.query_events(QueryRun(self, user_prompt))
+
+    def astream_query(self, user_prompt):
+        return self.aquery_events(QueryRun(self, user_prompt))
+
+
+class QueryRun:
+    """One answer as it is produced: the per-request state and the events the
+    sync and async, streaming and /query paths are all built from.
+
+    timings and details are filled in as the answer progresses: stage
+    timings, source_status, context_tokens and answer_cache.
+    """
+
+    def __init__(self, processor, user_prompt, timings=None, details=None):
+        self.processor = processor
+        self.user_prompt = user_prompt
+        self.timings = timings if timings is not None else {}
+        self.details = details if details is not None else {}
+        self.statuses = self.details.setdefault("source_status", {})
+        self.results = processor.empty_results()
+        self.versions = None
+        self.in_flight = None  # Future of a claimed answer, until it is resolved
+        self.error = None
+        self.prompt = None
+        self.chunks = []
+        self.start_time = time.time()
+        self.stage_start = self.start_time
+        self.deadline = time.monotonic() + processor.deadline_ms / 1000
+        self.sources_deadline = self.deadline - processor.summary_budget_ms / 1000
+
+    @property
+    def answer(self):
+        return "".join(self.chunks)
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0)
+
+    def check_deadline(self):
+        # The LLM client bounds each attempt at the summary to its budget;
+        # this bounds a summary that keeps streaming past the deadline.
+        if time.monotonic() > self.deadline:
+            raise TimeoutError(f"Summary missed the {self.processor.deadline_ms:.0f} ms request deadline")
+
+    def stage_done(self, stage):
+        now = time.time()
+        observe_stage(stage, (now - self.stage_start) * 1000, self.timings)
+        self.stage_start = now
+
+    def claim(self, versions):
+        # Identical prompts in flight share one computation; recent answers
+        # for the same data versions are served from the cache.
+        self.versions = versions
+        status, value = answer_cache.claim(self.user_prompt, versions)
+        self.details["answer_cache"] = status
+        if status == "miss":
+            self.in_flight = value
+        return status, value
+
+    def routing_event(self, routing):
+        self.stage_start = time.time()
+        return {"event": "routing", "data": routing}
+
+    def source_event(self, source, result, elapsed_ms, status):
+        self.results[source] = result
+        self.timings[source] = elapsed_ms
+        self.statuses[source] = status
+        size = len(result) if isinstance(result, list) else result.get("row_count", 0)
+        return {"event": "progress", "data": {"source": source, "elapsed_ms": elapsed_ms, "items": size,
+                                              "status": status}}
+
+    def summary_prompt(self):
+        self.stage_done("sources")
+        processor = self.processor
+        inputs = processor.summary_inputs(self.user_prompt, self.results["mysql"], self.results["vector"],
+                                          self.results["postgresql"], self.details, self.statuses)
+        self.prompt = processor.summary_prompt.format(**inputs)
+        return self.prompt
+
+    def token_event(self, text):
+        if not text:
+            return None
+        self.chunks.append(text)
+        return {"event": "token", "data": {"text": text}}
+
+    def summary_done(self):
+        self.stage_done("summary")
+        record_tokens("summary", self.prompt, self.answer)
+
+    def done_event(self):
+        return {"event": "done", "data": {
+            "timings_ms": self.timings,
+            "processing_time_ms": round((time.time() - self.start_time) * 1000, 2),
+            **self.details
+        }}
+
+    def shared_events(self, summary):
+        yield self.token_event(summary)
+        yield self.done_event()
+
+    def resolve(self, answer=None, error=None, store=True):
+        if self.in_flight is not None:
+            answer_cache.resolve(self.user_prompt, self.versions, self.in_flight, answer, error, store)
+            self.in_flight = None
+
+    def finish(self):
+        """Share the answer with waiting requests, cache it if it is complete,
+        and return the done event."""
+        self.resolve(self.answer, store=self.processor.complete(self.statuses, self.versions))
+        return self.done_event()
+
+    def error_event(self, error):
+        logger.error(f"Error answering query: {error}")
+        self.error = error
+        self.resolve(error=error)
+        return {"event": "error", "data": {"error": str(error) or type(error).__name__}}
+
+    def abandon(self):
+        # A stream closed before its answer was finished, e.g. by a client
+        # disconnect, must not leave identical requests waiting on it.
+        self.resolve(error=RuntimeError("The request computing this answer was abandoned"))
+
+    def collect(self, events):
+        """Consume events and return the answer, raising the error of an error event."""
+        for event in events:
+            if event["event"] == "error":
+                raise self.error
+        return self.answer
+
+
+def format_sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=default_serializer)}\n\n"
+
+processor = MainProcessor()
+record_startup("import", (time.perf_counter() - _import_start) * 1000)
+
+@app.route("/")
+def index():
+    app.logger.info("Index route accessed")
+    return render_template("index.html")
+
+@app.route("/query", methods=["POST"])
+def process_query_route():
+    try:
+        start_time = time.time()
+        data = request.json
+        user_prompt = data.get("prompt", "")
+        timings, details = {}, {}
+        with request_scope() as stage_timings:
+            result = processor.process_query(user_prompt, timings, details)
+        end_time = time.time()
+        processing_time = (end_time - start_time) * 1000  # Convert to milliseconds
+        response = {
+            "result": result,
+            "processing_time_ms": round(processing_time, 2),
+            "timings_ms": timings,
+            **details
+        }
+        # Opt-in breakdown of every instrumented stage, e.g. mysql.sql_generation
+        if data.get("timings"):
+            response["stage_timings_ms"] = stage_timings
+        REQUESTS.inc(endpoint="/query", status="ok")
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error in /query route: {e}")
+        REQUESTS.inc(endpoint="/query", status="error")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/query/stream", methods=["POST"])
+def stream_query_route():
+    data = request.json or {}
+    user_prompt = data.get("prompt", "")
+    events = (format_sse(event) for event in processor.stream_query(user_prompt))
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/cache/invalidate", methods=["POST"])
+def invalidate_cache_route():
+    # Drops all cached answers, or only those for {"prompt": ...}
+    data = request.get_json(silent=True) or {}
+    return jsonify({"invalidated": answer_cache.invalidate(data.get("prompt"))})
+
+@app.route("/metrics")
+def metrics_route():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    processor.warm_up()
     app.run(host="0.0.0.0", port=8008, debug=True, use_reloader=False, threaded = True)
\ No newline at end of file
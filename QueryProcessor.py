@@ -1,100 +1,98 @@
-# main.py
-
-import os
-from dotenv import load_dotenv
-import mysql.connector
-from mysql.connector import Error as MySQLError
-from langchain_community.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_openai import OpenAIEmbeddings
-import logging
-import json
-from datetime import date
-# from vecdata1 import DocumentProcessor  # Import DocumentProcessor from vecdata1
-from schema import get_mysql_schema
-from DocumentProcessor import DocumentProcessor
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-processor=DocumentProcessor()
-class QueryProcessor:
-    def __init__(self):
-        load_dotenv()
-
-        # OpenAI API Key
-        self.api_key = os.getenv("OPENAI_API_KEY")
-
-        
-
-
-
-        # MySQL Database Configuration
-        self.mysql_db_config = {
-            "user": os.getenv("MYSQL_USER"),
-            "password": os.getenv("MYSQL_PASSWORD"),
-            "host": os.getenv("MYSQL_HOST"),
-            "database": os.getenv("MYSQL_DATABASE")
-        }
-
-        # Initialize the LLM model
-        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=self.api_key)
-
-        # Define prompts
-        self.sql_prompt_template = """
-        You are a SQL expert. Given the schema of the database and a natural language request, generate an accurate SQL query. Please provide only the SQL query with no additional text or explanation.
-
-        Database Schema:
-        {schema_info}
-
-        Natural Language Request:
-        {user_query}
-
-        SQL Query:
-        """
-
-        # Initialize LLM Chains
-        self.llm_chain_sql = LLMChain(
-            prompt=PromptTemplate(input_variables=["schema_info", "user_query"], template=self.sql_prompt_template),
-            llm=self.llm
-        )
-
-        # Initialize embeddings
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
-
-        
-      
-    def generate_and_execute_sql_query(self, user_query):
-        try:
-            schema_info, _, _ = get_mysql_schema(self.mysql_db_config)
-
-            # Generate SQL query
-            prompt_result = self.llm_chain_sql.run({
-                "schema_info": schema_info,
-                "user_query": user_query
-            })
-
-            sql_query = prompt_result.strip()
-            logger.info(f"Generated SQL Query: {sql_query}")
-
-            if not sql_query.lower().startswith("select"):
-                raise ValueError("The generated SQL query is not a SELECT query.")
-
-            # Execute SQL query
-            results = []
-            try:
-                conn = mysql.connector.connect(**self.mysql_db_config)
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(sql_query)
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-            except MySQLError as err:
-                logger.error(f"Error executing SQL query: {err}")
-            return results
-        except Exception as e:
-            logger.error(f"Error generating or executing SQL query: {e}")
-            raise
-
-    
\ No newline at end of file
+# main.py
+
+import os
+from dotenv import load_dotenv
+from mysql.connector import Error as MySQLError
+import logging
+# from vecdata1 import DocumentProcessor  # Import DocumentProcessor from vecdata1
+from schema import get_mysql_schema, get_mysql_schema_fingerprint, peek_mysql_schema, render_mysql_schema
+from sql_source import SQLSource
+from result_fetch import afetch_bounded_mysql, fetch_bounded, fetch_limits, inject_limit
+from db_pool import get_async_mysql_pool, get_mysql_pool
+from sql_guard import MYSQL_QUERY_TIMEOUT, StatementTimeout, mysql_plan_cost, mysql_timeout_hint
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class QueryProcessor(SQLSource):
+    source = "mysql"
+
+    def __init__(self):
+        load_dotenv()
+
+        # MySQL Database Configuration
+        self.mysql_db_config = {
+            "user": os.getenv("MYSQL_USER"),
+            "password": os.getenv("MYSQL_PASSWORD"),
+            "host": os.getenv("MYSQL_HOST"),
+            "database": os.getenv("MYSQL_DATABASE")
+        }
+
+        super().__init__(self.mysql_db_config, get_mysql_schema, get_mysql_schema_fingerprint, peek_mysql_schema,
+                         render_mysql_schema)
+
+    def execute_sql_query(self, sql_query):
+        # Stream at most max_rows rows / max_bytes. The server aborts the
+        # query once it runs past the statement timeout.
+        max_rows, max_bytes, batch_size = fetch_limits()
+        timeout_ms = self.statement_timeout_ms
+        try:
+            pool = get_mysql_pool(self.mysql_db_config)
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(mysql_timeout_hint(inject_limit(sql_query, max_rows), timeout_ms))
+                results = fetch_bounded(cursor, max_rows, max_bytes, batch_size)
+                if results["truncated"]:
+                    # Dropping the connection stops the rest of the result
+                    # instead of reading it off the wire.
+                    pool.discard(conn)
+                else:
+                    cursor.close()
+            return results
+        except MySQLError as err:
+            if err.errno == MYSQL_QUERY_TIMEOUT:
+                raise StatementTimeout(f"MySQL query ran past the {timeout_ms} ms statement timeout") from err
+            logger.error(f"Error executing SQL query: {err}")
+            raise
+
+    async def aexecute_sql_query(self, sql_query):
+        import aiomysql
+        from pymysql import MySQLError as AsyncMySQLError
+
+        max_rows, max_bytes, batch_size = fetch_limits()
+        timeout_ms = self.statement_timeout_ms
+        try:
+            pool = await get_async_mysql_pool(self.mysql_db_config)
+            async with pool.acquire() as conn:
+                cursor = await conn.cursor(aiomysql.SSCursor)
+                await cursor.execute(mysql_timeout_hint(inject_limit(sql_query, max_rows), timeout_ms))
+                results = await afetch_bounded_mysql(cursor, max_rows, max_bytes, batch_size)
+                if results["truncated"]:
+                    # Closing an SSCursor would read the rest of the result;
+                    # a closed connection is dropped by the pool instead.
+                    conn.close()
+                else:
+                    await cursor.close()
+                return results
+        except AsyncMySQLError as err:
+            if err.args and err.args[0] == MYSQL_QUERY_TIMEOUT:
+                raise StatementTimeout(f"MySQL query ran past the {timeout_ms} ms statement timeout") from err
+            logger.error(f"Error executing SQL query: {err}")
+            raise
+
+    def plan_cost(self, sql_query):
+        with get_mysql_pool(self.mysql_db_config).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"EXPLAIN FORMAT=JSON {sql_query}")
+            row = cursor.fetchone()
+            cursor.close()
+        return mysql_plan_cost(row[0])
+
+    async def aplan_cost(self, sql_query):
+        pool = await get_async_mysql_pool(self.mysql_db_config)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"EXPLAIN FORMAT=JSON {sql_query}")
+                row = await cursor.fetchone()
+        return mysql_plan_cost(row[0])
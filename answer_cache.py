@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from sql_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """Final /query answers keyed by normalized prompt and data versions, with
+    single-flight coalescing of identical prompts that are in flight.
+
+    versions is a dict of data-version markers (schema fingerprints, the
+    ingestion manifest version); when any of them changes the old answers
+    simply stop matching. Row-level changes in the SQL backends are not
+    visible in any marker, which is what the ttl bounds.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 500))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", 120))
+        self.entries = OrderedDict()  # key -> (answer, created_at)
+        self.in_flight = {}  # key -> Future shared by identical concurrent requests
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(prompt, versions):
+        return normalize_question(prompt), tuple(sorted((versions or {}).items()))
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def lookup(self, prompt, versions):
+        with self.lock:
+            entry = self._get(self.key(prompt, versions))
+            self.counters["hits" if entry else "misses"] += 1
+        return entry[0] if entry else None
+
+    def store(self, prompt, versions, answer):
+        with self.lock:
+            self._store(self.key(prompt, versions), answer)
+
+    def _store(self, key, answer):
+        self.entries[key] = (answer, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _claim(self, key):
+        """Return (status, entry_or_future, leader) for key under the lock."""
+        with self.lock:
+            entry = self._get(key)
+            if entry:
+                self.counters["hits"] += 1
+                return "hit", entry[0], False
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return "coalesced", future, False
+            self.counters["misses"] += 1
+            future = self.in_flight[key] = Future()
+            return "miss", future, True
+
+    def _finish(self, key, future, answer=None, error=None, store=True):
+        with self.lock:
+            # An invalidation while computing drops the in-flight marker; the
+            # answer was computed against older data and is not stored.
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+                if error is None and store:
+                    self._store(key, answer)
+        if error is None:
+            future.set_result(answer)
+        else:
+            future.set_exception(error)
+
+    def claim(self, prompt, versions):
+        """Return (status, value) for a caller that produces the answer piecewise,
+        e.g. while streaming it.
+
+        A "hit" comes with the cached answer and a "coalesced" request with
+        the Future of the identical request already computing it. On a "miss"
+        the caller is that request: value is the Future its followers wait on,
+        which it must settle through resolve(), also when it fails or gives up.
+        """
+        status, value, _ = self._claim(self.key(prompt, versions))
+        return status, value
+
+    def resolve(self, prompt, versions, future, answer=None, error=None, store=True):
+        """Hand the answer (or error) of a claimed miss to its followers and cache it if store."""
+        self._finish(self.key(prompt, versions), future, answer, error, store)
+
+    def get_or_compute(self, prompt, versions, compute, cacheable=None):
+        """Return (answer, status); status is "hit", "coalesced" or "miss".
+
+        Only the first of several identical concurrent requests runs
+        compute(); the others wait for its answer (or its exception). The
+        answer is stored unless cacheable(answer) is false, e.g. for a partial
+        answer, which the waiting requests still share.
+        """
+        key = self.key(prompt, versions)
+        status, value, leader = self._claim(key)
+        if status == "hit":
+            return value, status
+        if not leader:
+            return value.result(), status
+        try:
+            answer = compute()
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, answer, store=cacheable is None or cacheable(answer))
+        return answer, status
+
+    async def aget_or_compute(self, prompt, versions, compute, cacheable=None):
+        """Async counterpart of get_or_compute; compute is a coroutine function."""
+        key = self.key(prompt, versions)
+        status, value, leader = self._claim(key)
+        if status == "hit":
+            return value, status
+        if not leader:
+            return await asyncio.wrap_future(value), status
+        try:
+            answer = await compute()
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, answer, store=cacheable is None or cacheable(answer))
+        return answer, status
+
+    def invalidate(self, prompt=None):
+        """Drop every cached answer, or only those for prompt."""
+        with self.lock:
+            if prompt is None:
+                dropped = len(self.entries)
+                self.entries.clear()
+                self.in_flight.clear()
+            else:
+                normalized = normalize_question(prompt)
+                keys = [key for key in self.entries if key[0] == normalized]
+                for key in keys:
+                    del self.entries[key]
+                for key in [key for key in self.in_flight if key[0] == normalized]:
+                    del self.in_flight[key]
+                dropped = len(keys)
+            self.counters["invalidations"] += 1
+        logger.info(f"Answer cache invalidated ({dropped} entries)")
+        return dropped
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+            stats["in_flight"] = len(self.in_flight)
+        lookups = stats["hits"] + stats["coalesced"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+answer_cache = AnswerCache()
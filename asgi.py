@@ -0,0 +1,89 @@
+# asgi.py
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from MainProcessor import processor, format_sse
+from answer_cache import answer_cache
+from db_pool import close_async_pools
+from metrics import REGISTRY, REQUESTS, request_scope
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(processor.warm_up)
+    yield
+    await close_async_pools()
+
+
+# ASGI entry point serving the same /query contract as the Flask app, with
+# LLM calls, DB queries and vector retrieval all awaited on one event loop.
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port 8008
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+@app.post("/query")
+async def process_query_route(request: Request):
+    try:
+        start_time = time.time()
+        data = await request.json()
+        user_prompt = data.get("prompt", "")
+        timings, details = {}, {}
+        with request_scope() as stage_timings:
+            result = await processor.aprocess_query(user_prompt, timings, details)
+        end_time = time.time()
+        processing_time = (end_time - start_time) * 1000  # Convert to milliseconds
+        response = {
+            "result": result,
+            "processing_time_ms": round(processing_time, 2),
+            "timings_ms": timings,
+            **details
+        }
+        if data.get("timings"):
+            response["stage_timings_ms"] = stage_timings
+        REQUESTS.inc(endpoint="/query", status="ok")
+        return response
+    except Exception as e:
+        logger.error(f"Error in /query route: {e}")
+        REQUESTS.inc(endpoint="/query", status="error")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.post("/query/stream")
+async def stream_query_route(request: Request):
+    data = await request.json()
+    user_prompt = data.get("prompt", "")
+
+    async def events():
+        async for event in processor.astream_query(user_prompt):
+            yield format_sse(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache_route(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    return {"invalidated": answer_cache.invalidate((data or {}).get("prompt"))}
+
+
+@app.get("/metrics")
+async def metrics_route():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8008)
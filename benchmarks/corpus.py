@@ -0,0 +1,64 @@
+"""Synthetic PDF/CSV corpus for ingestion and retrieval benchmarks."""
+
+import os
+import csv
+import random
+
+from benchmarks.fakes import WORDS
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Write a minimal text PDF; pages is a list of lists of lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"SKU-{rng.randint(1000, 9999)}")
+    return " ".join(words).capitalize() + "."
+
+
+def generate_corpus(directory, files, seed=0, csv_ratio=0.3, pages=3, rows=200):
+    """Create `files` documents in directory; returns their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        if rng.random() < csv_ratio:
+            path = os.path.join(directory, f"table_{i:05d}.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["sku", "category", "region", "amount", "note"])
+                for _ in range(rows):
+                    writer.writerow([f"SKU-{rng.randint(1000, 9999)}", rng.choice(WORDS), rng.choice(WORDS),
+                                     round(rng.uniform(1, 5000), 2), _sentence(rng)])
+        else:
+            path = os.path.join(directory, f"report_{i:05d}.pdf")
+            write_pdf(path, [[_sentence(rng) for _ in range(40)] for _ in range(pages)])
+        paths.append(path)
+    return paths
@@ -0,0 +1,250 @@
+"""Local stand-ins for OpenAI, the embedding API, MySQL and PostgreSQL.
+
+Everything here is deterministic for a given seed and has a configurable
+latency, so benchmark runs measure the pipeline's own overhead plus a known,
+fixed cost per external call.
+"""
+
+import re
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import hashlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from db_pool import ConnectionPool, register_pool
+from hybrid_retriever import tokenize
+from schema_cache import cache_key, schema_cache
+
+WORDS = (
+    "revenue customer order product invoice refund policy shipment warehouse region quarter "
+    "supplier contract discount payment account ledger forecast inventory campaign channel "
+    "subscription renewal churn support ticket escalation compliance audit report summary"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers SQL prompts with a SELECT over a table named in
+    the schema, and everything else with a deterministic pseudo-summary."""
+
+    latency_ms: float = 300.0
+    token_latency_ms: float = 0.0
+    summary_words: int = 60
+
+    @property
+    def _llm_type(self):
+        return "fake-benchmark"
+
+    def _respond(self, prompt):
+        if "SQL Query:" in prompt:
+            schema, _, request = prompt.partition("Natural Language Request:")
+            tables = re.findall(r"^\s*Table: (\w+)", schema, re.MULTILINE)
+            if not tables:
+                return "SELECT 1 AS value"
+            words = set(tokenize(request))
+            table = next((t for t in tables if t.lower() in words or t.lower().rstrip("s") in words), tables[0])
+            if words & {"how", "many", "count", "number"}:
+                return f"SELECT COUNT(*) AS total FROM {table}"
+            return f"SELECT * FROM {table}"
+        rng = random.Random(hashlib.md5(prompt.encode("utf-8")).hexdigest())
+        return " ".join(rng.choice(WORDS) for _ in range(self.summary_words))
+
+    def _prompt(self, messages):
+        return messages[-1].content if messages else ""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._respond(self._prompt(messages))
+        time.sleep((self.latency_ms + self.token_latency_ms * len(text.split())) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._respond(self._prompt(messages))
+        await asyncio.sleep((self.latency_ms + self.token_latency_ms * len(text.split())) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self._respond(self._prompt(messages)).split()
+        time.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(words):
+            time.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self._respond(self._prompt(messages)).split()
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+class HashEmbeddings(Embeddings):
+    """Feature-hashed bag of words: texts sharing terms get similar vectors,
+    so retrieval and semantic caches behave roughly like the real thing."""
+
+    def __init__(self, dimensions=256, latency_ms=50.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency_ms / 1000)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+_EXPLAIN_PATTERN = re.compile(r"^\s*EXPLAIN\s+(?:FORMAT\s*=\s*JSON|\(\s*FORMAT\s+JSON\s*\))\s*", re.IGNORECASE)
+
+
+class SQLiteCursor:
+    """Accepts the attributes psycopg2 named cursors are given (itersize), the
+    session settings the processors send (ignored) and their EXPLAIN
+    statements, answered in the dialect's JSON plan shape."""
+
+    def __init__(self, cursor, dialect="mysql"):
+        self._cursor = cursor
+        self.dialect = dialect
+        self.itersize = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=()):
+        if sql.lstrip()[:4].upper() == "SET ":
+            return None
+        explain = _EXPLAIN_PATTERN.match(sql)
+        if explain:
+            return self._explain(sql[explain.end():])
+        return self._cursor.execute(sql, params)
+
+    def _explain(self, sql):
+        # A rough planner cost: a full scan costs 1000, an index search 10.
+        steps = self._cursor.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        cost = float(sum(1000 if step[-1].startswith("SCAN") else 10 for step in steps))
+        if self.dialect == "postgresql":
+            plan = [{"Plan": {"Total Cost": cost}}]
+        else:
+            plan = {"query_block": {"cost_info": {"query_cost": f"{cost:.2f}"}}}
+        return self._cursor.execute("SELECT ?", (json.dumps(plan),))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Connection with the cursor(...) signature of mysql.connector and psycopg2."""
+
+    def __init__(self, path, latency_ms=0.0, dialect="mysql"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self.latency_ms = latency_ms
+        self.dialect = dialect
+
+    def cursor(self, *args, **kwargs):
+        # Stands in for the network round trip of a real server.
+        time.sleep(self.latency_ms / 1000)
+        return SQLiteCursor(self._conn.cursor(), self.dialect)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+BASE_TABLES = {
+    "customers": [("customer_id", "INTEGER"), ("name", "TEXT"), ("region", "TEXT"), ("created_at", "TEXT")],
+    "products": [("product_id", "INTEGER"), ("sku", "TEXT"), ("category", "TEXT"), ("price", "REAL")],
+    "orders": [("order_id", "INTEGER"), ("customer_id", "INTEGER"), ("order_date", "TEXT"), ("total", "REAL")],
+    "events": [("event_id", "INTEGER"), ("event_type", "TEXT"), ("event_amount", "REAL"), ("event_date", "TEXT")],
+}
+FOREIGN_KEYS = {"orders": [("customer_id", "customers", "customer_id")]}
+
+
+def build_sqlite_database(path, tables=12, rows=2000, seed=0):
+    """Create the four base tables plus filler tables up to `tables`, so the
+    schema pruner has something to prune."""
+    rng = random.Random(seed)
+    definitions = dict(BASE_TABLES)
+    for i in range(max(0, tables - len(BASE_TABLES))):
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}"
+        definitions[name] = [(f"{name}_id", "INTEGER")] + [
+            (f"{rng.choice(WORDS)}_{j}", rng.choice(("INTEGER", "REAL", "TEXT"))) for j in range(rng.randint(3, 8))
+        ]
+
+    conn = sqlite3.connect(path)
+    for name, columns in definitions.items():
+        column_sql = [f"{column} {kind}" + (" PRIMARY KEY" if k == 0 else "") for k, (column, kind) in enumerate(columns)]
+        column_sql += [f"FOREIGN KEY ({column}) REFERENCES {ref}({ref_column})"
+                       for column, ref, ref_column in FOREIGN_KEYS.get(name, [])]
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"CREATE TABLE {name} ({', '.join(column_sql)})")
+
+        def value(kind):
+            if kind == "INTEGER":
+                return rng.randint(1, rows)
+            if kind == "REAL":
+                return round(rng.uniform(1, 5000), 2)
+            return rng.choice(WORDS)
+
+        conn.executemany(
+            f"INSERT INTO {name} VALUES ({', '.join('?' for _ in columns)})",
+            [tuple(row if k == 0 else value(kind) for k, (_, kind) in enumerate(columns))
+             for row in range(1, rows + 1)]
+        )
+    conn.commit()
+    conn.close()
+
+
+def sqlite_schema_entry(path, render):
+    """Schema cache entry in the shape schema.py / postgresql.py produce."""
+    conn = sqlite3.connect(path)
+    tables = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+        info = conn.execute(f"PRAGMA table_info({name})").fetchall()
+        tables[name] = {
+            "columns": [(column[1].lower(), column[2]) for column in info],
+            "primary_key": [column[1].lower() for column in info if column[5]],
+            "foreign_keys": [(fk[3].lower(), fk[2].lower(), fk[4].lower())
+                             for fk in conn.execute(f"PRAGMA foreign_key_list({name})")],
+        }
+    conn.close()
+    return {
+        "tables": tables,
+        "schema_info": render(tables),
+        "table_names": {name.lower() for name in tables},
+        "column_names": {column for table in tables.values() for column, _ in table["columns"]},
+    }
+
+
+def install_sql_backend(backend, db_config, path, render, latency_ms=0.0):
+    """Serve db_config from the SQLite file at path: a pooled SQLite connection
+    for query execution and a pre-seeded schema cache entry for introspection."""
+    register_pool(backend, db_config, ConnectionPool(
+        name=f"{backend}:{db_config.get('database')}",
+        connect=lambda: SQLiteConnection(path, latency_ms, backend),
+        ping=lambda conn: None,
+        reset=lambda conn: conn.rollback(),
+    ))
+    entry = sqlite_schema_entry(path, render)
+    fingerprint = hashlib.md5(entry["schema_info"].encode("utf-8")).hexdigest()
+    schema_cache.invalidate(cache_key(backend, db_config))
+    return schema_cache.get(cache_key(backend, db_config), lambda: entry, lambda: fingerprint)
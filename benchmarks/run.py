@@ -0,0 +1,306 @@
+"""Offline benchmark and load test for the /query pipeline and ingestion.
+
+    python -m benchmarks.run --corpus-sizes 20,100 --concurrency 1,4,16 --requests 60
+    python -m benchmarks.run --compare benchmarks/results/20261018T101500Z.json
+
+Run from the repository root. OpenAI, the embedding API, Pinecone, MySQL and
+PostgreSQL are replaced by the local stand-ins in benchmarks/fakes.py, so no
+credentials or network are needed. Each corpus size runs in a fresh worker
+process (module-level state such as the schema cache and the metrics
+registry starts empty) and reports:
+- ingestion throughput and per-stage time for the synthetic corpus
+- per (mode, concurrency): requests/s and p50/p95/p99 per stage, where mode
+  is "process_query" (MainProcessor.process_query) or "route" (POST /query
+  through the Flask test client)
+Results are written as JSON; --compare prints the change against an earlier run.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+QUESTION_TEMPLATES = (
+    "How many orders were placed by customers in the {word} region?",
+    "What is the total event_amount per event_type for {word} events?",
+    "Show the products in the {word} category with the highest price",
+    "List customers created in {year} and their orders",
+    "Explain the {word} policy for SKU-{sku}",
+    "Summarize the {word} report for the last quarter",
+    "What does the document say about {word} and {other}?",
+)
+
+
+def build_questions(count, seed=0, vocabulary=12):
+    """Templated questions over a small vocabulary, so the same and near-same
+    questions recur the way they do in real traffic."""
+    from benchmarks.fakes import WORDS
+
+    rng = random.Random(seed)
+    words = WORDS[:vocabulary]
+    return [
+        rng.choice(QUESTION_TEMPLATES).format(
+            word=rng.choice(words), other=rng.choice(words),
+            year=rng.choice((2022, 2023, 2024)), sku=rng.randint(1000, 1019)
+        )
+        for _ in range(count)
+    ]
+
+
+def percentiles(values):
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+def summarize_stages(samples):
+    stages = {}
+    for sample in samples:
+        for stage, elapsed_ms in sample.items():
+            stages.setdefault(stage, []).append(elapsed_ms)
+    return {stage: percentiles(values) for stage, values in sorted(stages.items())}
+
+
+def run_load(call, questions, concurrency):
+    """Issue every question through call(question) -> stage timings with
+    `concurrency` client threads; returns throughput and per-stage percentiles."""
+    samples, errors = [], []
+
+    def one(question):
+        start = time.perf_counter()
+        try:
+            stages = dict(call(question))
+        except Exception as e:
+            errors.append(str(e))
+            return
+        stages["total"] = round((time.perf_counter() - start) * 1000, 2)
+        samples.append(stages)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, questions))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "stages_ms": summarize_stages(samples),
+    }
+
+
+def configure_environment(config, workdir):
+    corpus_dir = os.path.join(workdir, "corpus")
+    os.environ.update({
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25_index.pkl"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "MANIFEST_PATH": os.path.join(workdir, "ingestion_manifest.json"),
+        "MANIFEST_VERSION_PATH": os.path.join(workdir, "processed_files.txt"),
+        "DATA_DIR_PATH": corpus_dir,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "sk-benchmark-offline",
+        "MYSQL_HOST": "sqlite", "MYSQL_USER": "bench", "MYSQL_PASSWORD": "", "MYSQL_DATABASE": "bench_mysql",
+        "POSTSQL_HOST": "sqlite", "POSTSQL_USER": "bench", "POSTSQL_PASSWORD": "", "POSTSQL_DATABASE": "bench_pg",
+    })
+    if config.get("ingest_workers"):
+        os.environ["INGEST_WORKERS"] = str(config["ingest_workers"])
+    return corpus_dir
+
+
+def run_worker(config):
+    """Benchmark one corpus size in this process; returns a JSON-able dict."""
+    workdir = tempfile.mkdtemp(prefix="datamind-bench-")
+    corpus_dir = configure_environment(config, workdir)
+
+    from benchmarks.fakes import FakeChatModel, HashEmbeddings, build_sqlite_database, install_sql_backend
+    from benchmarks.corpus import generate_corpus
+    from clients import set_client
+    from embedding_service import EmbeddingService, set_embedding_service
+
+    # The stand-ins have to be registered before the processors are created.
+    set_embedding_service(EmbeddingService(embedder=HashEmbeddings(latency_ms=config["embed_latency_ms"]),
+                                           model="hash-256"))
+    llm = FakeChatModel(latency_ms=config["llm_latency_ms"], token_latency_ms=config["llm_token_latency_ms"])
+    for name in ("llm", "sql_llm.mysql", "sql_llm.postgresql"):
+        set_client(name, llm)
+    import MainProcessor as main_module
+    from answer_cache import answer_cache
+    from metrics import request_scope
+    from schema import render_mysql_schema
+    from postgresql import render_postgres_schema
+    from schema_cache import schema_cache
+
+    processor = main_module.processor
+    # Seeded entries must never be re-validated against a real server.
+    schema_cache.ttl = float("inf")
+    for backend, db_config, render in (
+        ("mysql", processor.query_processor.mysql_db_config, render_mysql_schema),
+        ("postgresql", processor.postgresql_processor.postgresql_db_config, render_postgres_schema),
+    ):
+        path = os.path.join(workdir, f"{backend}.sqlite3")
+        build_sqlite_database(path, tables=config["tables"], rows=config["rows"], seed=config["seed"])
+        install_sql_backend(backend, db_config, path, render, latency_ms=config["db_latency_ms"])
+
+    generate_corpus(corpus_dir, config["corpus_size"], seed=config["seed"])
+    start = time.perf_counter()
+    with request_scope() as ingest_stages:
+        processor.document_processor.ingest_documents(corpus_dir)
+    ingest_s = time.perf_counter() - start
+    ingestion = {
+        "files": config["corpus_size"],
+        "chunks": len(processor.document_processor.get_bm25_index()),
+        "wall_s": round(ingest_s, 3),
+        "files_per_s": round(config["corpus_size"] / ingest_s, 2) if ingest_s else 0.0,
+        "stages_ms": ingest_stages,
+    }
+    processor.warm_up()
+
+    clients = threading.local()
+
+    def via_process_query(question):
+        with request_scope() as stages:
+            processor.process_query(question)
+        return stages
+
+    def via_route(question):
+        if not hasattr(clients, "client"):
+            clients.client = main_module.app.test_client()
+        response = clients.client.post("/query", json={"prompt": question, "timings": True})
+        data = response.get_json()
+        if response.status_code != 200:
+            raise RuntimeError(data.get("error", response.status_code))
+        return data["stage_timings_ms"]
+
+    modes = {"process_query": via_process_query, "route": via_route}
+    questions = build_questions(config["requests"], seed=config["seed"])
+    loads = []
+    for mode in config["modes"]:
+        for concurrency in config["concurrency"]:
+            # Every run starts with cold SQL and answer caches; the embedding
+            # cache stays warm, as it would in a long-running server.
+            processor.query_processor.sql_cache.invalidate()
+            processor.postgresql_processor.sql_cache.invalidate()
+            answer_cache.invalidate()
+            answer_cache.counters = dict.fromkeys(answer_cache.counters, 0)
+            result = run_load(modes[mode], questions, concurrency)
+            result["mode"] = mode
+            result["caches"] = {
+                "answer": answer_cache.stats(),
+                "embedding": processor.query_processor.embeddings.stats(),
+                "sql_mysql": processor.query_processor.sql_cache.stats(),
+                "sql_postgresql": processor.postgresql_processor.sql_cache.stats(),
+            }
+            loads.append(result)
+            print(f"corpus={config['corpus_size']} mode={mode} concurrency={concurrency}: "
+                  f"{result['throughput_rps']} req/s, total p95 "
+                  f"{result['stages_ms'].get('total', {}).get('p95')} ms", file=sys.stderr)
+
+    return {"corpus_size": config["corpus_size"], "ingestion": ingestion, "loads": loads}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline):
+    """Print throughput and p50/p95 deltas for runs present in both results."""
+    def index(results):
+        return {(run["corpus_size"], load["mode"], load["concurrency"]): load
+                for run in results["runs"] for load in run["loads"]}
+
+    before, after = index(baseline), index(current)
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        print(f"corpus={key[0]} mode={key[1]} concurrency={key[2]}: "
+              f"{old['throughput_rps']} -> {new['throughput_rps']} req/s")
+        for stage in sorted(set(old["stages_ms"]) & set(new["stages_ms"])):
+            o, n = old["stages_ms"][stage], new["stages_ms"][stage]
+            change = (n["p95"] - o["p95"]) / o["p95"] * 100 if o["p95"] else 0.0
+            print(f"  {stage:32} p50 {o['p50']:>9} -> {n['p50']:>9}  p95 {o['p95']:>9} -> {n['p95']:>9} "
+                  f"({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the /query pipeline.")
+    parser.add_argument("--corpus-sizes", default="20,100", help="Comma-separated document counts")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=60, help="Requests per (mode, concurrency) run")
+    parser.add_argument("--modes", default="process_query,route")
+    parser.add_argument("--tables", type=int, default=12, help="Tables per fake SQL backend")
+    parser.add_argument("--rows", type=int, default=2000, help="Rows per fake table")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    parser.add_argument("--ingest-workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<UTC time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Earlier results file to compare against")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    config = {
+        "concurrency": [int(c) for c in args.concurrency.split(",")],
+        "requests": args.requests,
+        "modes": args.modes.split(","),
+        "tables": args.tables,
+        "rows": args.rows,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_token_latency_ms": args.llm_token_latency_ms,
+        "embed_latency_ms": args.embed_latency_ms,
+        "db_latency_ms": args.db_latency_ms,
+        "ingest_workers": args.ingest_workers,
+        "seed": args.seed,
+    }
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "config": config,
+        "runs": [],
+    }
+    for corpus_size in [int(size) for size in args.corpus_sizes.split(",")]:
+        worker_config = dict(config, corpus_size=corpus_size)
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.run", "--worker", json.dumps(worker_config)],
+                                   stdout=subprocess.PIPE, text=True, check=True)
+        results["runs"].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
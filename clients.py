@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_locks = {}
+_lock = threading.Lock()
+_startup = {}  # phase -> milliseconds
+
+SOURCE_BUDGET_DEFAULTS_MS = {"mysql": 10000, "postgresql": 10000, "vector": 4000, "summary": 8000}
+# Shortest request timeout worth retrying within; below it one attempt gets the whole window
+MIN_LLM_ATTEMPT_S = 4.0
+
+
+def _client_lock(name):
+    with _lock:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def record_startup(phase, elapsed_ms):
+    _startup[phase] = round(elapsed_ms, 2)
+
+
+def get_client(name, factory):
+    """Return the process-wide client called name, creating it on first use.
+
+    Concurrent first calls build the client once; the others wait for it.
+    Creation time is recorded in the startup report.
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _client_lock(name):
+        client = _clients.get(name)
+        if client is None:
+            start = time.perf_counter()
+            client = _clients[name] = factory()
+            record_startup(name, (time.perf_counter() - start) * 1000)
+            logger.info(f"Created shared client {name} in {_startup[name]:.0f} ms")
+        return client
+
+
+def peek_client(name):
+    return _clients.get(name)
+
+
+def set_client(name, client):
+    """Install a client up front, e.g. a local stand-in for benchmarks."""
+    with _client_lock(name):
+        _clients[name] = client
+
+
+def source_budget_ms(source):
+    """Latency budget of a fan-out source, or with "summary" the part of the
+    request deadline kept for the summary; a source that misses its budget
+    is answered without."""
+    return float(os.getenv(f"{source.upper()}_BUDGET_MS", SOURCE_BUDGET_DEFAULTS_MS[source]))
+
+
+def _chat_model(request_timeout, max_retries):
+    from langchain_community.chat_models import ChatOpenAI
+    return ChatOpenAI(model=os.getenv("LLM_MODEL", "gpt-3.5-turbo"), temperature=0,
+                      openai_api_key=os.getenv("OPENAI_API_KEY"),
+                      request_timeout=request_timeout, max_retries=max_retries)
+
+
+def llm_limits(window):
+    """(request timeout in seconds, max retries) so that every attempt together fits in window seconds."""
+    retries = 1 if window >= 2 * MIN_LLM_ATTEMPT_S else 0
+    return window / (retries + 1), retries
+
+
+def get_llm():
+    # The summary starts no later than its budget before the request deadline,
+    # so every attempt at it must fit in that budget.
+    return get_client("llm", lambda: _chat_model(*llm_limits(source_budget_ms("summary") / 1000)))
+
+
+def sql_llm_limits(source):
+    """(request timeout in seconds, max retries) for SQL generation.
+
+    Every attempt together must fit in SQL_GENERATION_BUDGET_SHARE of the
+    source's budget, leaving the rest to run the query; otherwise an
+    abandoned call keeps a fan-out worker busy long after the request
+    stopped waiting for it.
+    """
+    return llm_limits(source_budget_ms(source) / 1000 * float(os.getenv("SQL_GENERATION_BUDGET_SHARE", 0.6)))
+
+
+def get_sql_llm(source):
+    return get_client(f"sql_llm.{source}", lambda: _chat_model(*sql_llm_limits(source)))
+
+
+def get_pinecone():
+    def create():
+        from pinecone import Pinecone
+        return Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return get_client("pinecone", create)
+
+
+def get_document_processor():
+    def create():
+        from DocumentProcessor import DocumentProcessor
+        return DocumentProcessor()
+    return get_client("document_processor", create)
+
+
+def get_query_processor():
+    def create():
+        from QueryProcessor import QueryProcessor
+        return QueryProcessor()
+    return get_client("query_processor", create)
+
+
+def get_postgresql_processor():
+    def create():
+        from PostgreSQLProcessor import PostgreSQLProcessor
+        return PostgreSQLProcessor()
+    return get_client("postgresql_processor", create)
+
+
+def source_workers():
+    return int(os.getenv("SOURCE_WORKERS", 32))
+
+
+def get_source_executor():
+    # Shared by all requests: a request that stops waiting for a slow source
+    # does not wait for its thread either, and the pool size caps how many
+    # source calls run at once; the rest queue and count against their budget.
+    def create():
+        from concurrent.futures import ThreadPoolExecutor
+        return ThreadPoolExecutor(max_workers=source_workers(), thread_name_prefix="source")
+    return get_client("source_executor", create)
+
+
+def startup_report():
+    return dict(_startup)
+
+
+def _startup_samples():
+    for phase, elapsed_ms in list(_startup.items()):
+        yield ("datamind_startup_ms", "gauge", "Time spent creating shared clients and warming up",
+               {"phase": phase}, elapsed_ms)
+
+
+def _reset_after_fork():
+    # HTTP sessions must not be shared between pre-forked workers; each child
+    # builds its own on first use.
+    global _lock
+    _clients.clear()
+    _locks.clear()
+    _lock = threading.Lock()
+
+
+REGISTRY.register_collector(_startup_samples)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import logging
+
+from hybrid_retriever import chunk_key
+from metrics import estimate_tokens
+from result_fetch import default_serializer
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Prompt text for a source that gave no result, by fan-out status
+UNAVAILABLE = {
+    "timed_out": "Not available: this source did not respond in time.",
+    "rejected": "Not available: the query for this source was estimated too expensive to run.",
+    "failed": "Not available: this source returned an error.",
+}
+
+
+def _dumps(value):
+    return json.dumps(value, default=default_serializer, separators=(",", ":"), ensure_ascii=False)
+
+
+def _shingles(text, size=5):
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _clip(text, budget):
+    """Cut text to roughly budget tokens at a word boundary."""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    clipped = text[:low].rsplit(" ", 1)[0] if " " in text[:low] else text[:low]
+    return clipped + " …"
+
+
+class ContextAssembler:
+    """Renders source results for the summary prompt within per-source token budgets.
+
+    SQL results become a column header plus one compact JSON array per row,
+    kept in the query's own order (its ORDER BY is the ranking) until the
+    budget is spent. Document chunks arrive ranked by the retriever; exact
+    and overlapping duplicates (most of their word 5-grams already included)
+    are dropped, the rest rendered with their source until the budget is
+    spent, clipping the last one to fit.
+    """
+
+    def __init__(self, sql_budget=None, document_budget=None, overlap_threshold=None, min_clip_tokens=40):
+        self.sql_budget = sql_budget or int(os.getenv("SUMMARY_SQL_TOKEN_BUDGET", 1200))
+        self.document_budget = document_budget or int(os.getenv("SUMMARY_DOCUMENT_TOKEN_BUDGET", 1500))
+        self.overlap_threshold = overlap_threshold or float(os.getenv("SUMMARY_OVERLAP_THRESHOLD", 0.8))
+        self.min_clip_tokens = min_clip_tokens
+
+    def render_sql(self, result, budget=None):
+        budget = budget or self.sql_budget
+        rows = result.get("rows", []) if isinstance(result, dict) else []
+        stats = {"rows_total": len(rows), "rows_included": 0, "tokens": 0}
+        if not rows:
+            text = "No rows."
+            stats["tokens"] = estimate_tokens(text)
+            return text, stats
+
+        lines = [f"columns: {_dumps(result.get('columns', []))}"]
+        used = estimate_tokens(lines[0])
+        for row in rows:
+            line = _dumps(row)
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        stats["rows_included"] = len(lines) - 1
+
+        omitted = len(rows) - stats["rows_included"]
+        if omitted or result.get("truncated"):
+            note = f"({omitted} more rows not shown" if omitted else "(more rows not shown"
+            lines.append(note + (", result truncated at the fetch limit)" if result.get("truncated") else ")"))
+        text = "\n".join(lines)
+        stats["tokens"] = estimate_tokens(text)
+        return text, stats
+
+    @staticmethod
+    def _label(doc):
+        metadata = doc.metadata or {}
+        label = metadata.get("filename") or metadata.get("source") or "document"
+        if metadata.get("page") is not None:
+            label += f" p.{int(metadata['page']) + 1}"
+        elif metadata.get("row") is not None:
+            label += f" row {metadata['row']}"
+        return label
+
+    def render_documents(self, documents, budget=None):
+        budget = budget or self.document_budget
+        documents = documents or []
+        stats = {"chunks_total": len(documents), "chunks_included": 0, "duplicates_removed": 0, "tokens": 0}
+
+        seen_keys, seen_shingles, blocks = set(), set(), []
+        used = 0
+        for doc in documents:
+            text = " ".join(doc.page_content.split())
+            key = chunk_key(doc)
+            shingles = _shingles(text)
+            if key in seen_keys or not shingles or \
+                    len(shingles & seen_shingles) / len(shingles) >= self.overlap_threshold:
+                stats["duplicates_removed"] += 1
+                continue
+
+            header = f"[{len(blocks) + 1}] {self._label(doc)}: "
+            remaining = budget - used - estimate_tokens(header)
+            cost = estimate_tokens(text)
+            if cost > remaining:
+                if remaining < self.min_clip_tokens:
+                    break
+                text = _clip(text, remaining)
+                cost = estimate_tokens(text)
+            blocks.append(header + text)
+            used += estimate_tokens(header) + cost
+            seen_keys.add(key)
+            seen_shingles |= shingles
+
+        stats["chunks_included"] = len(blocks)
+        text = "\n".join(blocks) if blocks else "No matching documents."
+        stats["tokens"] = estimate_tokens(text)
+        return text, stats
+
+    def assemble(self, user_query, mysql_results, vector_results, postgresql_results, statuses=None):
+        """Return (prompt inputs, token accounting per source).
+
+        statuses maps a source to its fan-out status; a source that timed out
+        or was rejected is described as unavailable rather than as empty.
+        """
+        sql_text, sql_stats = self.render_sql(mysql_results)
+        postgresql_text, postgresql_stats = self.render_sql(postgresql_results)
+        vector_text, vector_stats = self.render_documents(vector_results)
+        statuses = statuses or {}
+        sql_text = UNAVAILABLE.get(statuses.get("mysql"), sql_text)
+        postgresql_text = UNAVAILABLE.get(statuses.get("postgresql"), postgresql_text)
+        vector_text = UNAVAILABLE.get(statuses.get("vector"), vector_text)
+        accounting = {"mysql": sql_stats, "postgresql": postgresql_stats, "vector": vector_stats}
+        logger.info(f"Summary context tokens: mysql {sql_stats['tokens']}, postgresql {postgresql_stats['tokens']}, "
+                    f"vector {vector_stats['tokens']}")
+        return {
+            "user_query": user_query,
+            "sql_results": sql_text,
+            "postgresql_results": postgresql_text,
+            "vector_results": vector_text,
+        }, accounting
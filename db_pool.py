@@ -0,0 +1,321 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from clients import source_workers
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+# Monotonic time by which the current caller must have its answer; a checkout
+# never waits past it, whatever the pool's own checkout timeout.
+_caller_deadline = contextvars.ContextVar("caller_deadline", default=None)
+
+
+@contextmanager
+def caller_deadline(deadline):
+    token = _caller_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _caller_deadline.reset(token)
+
+
+def call_by(deadline, call, *args):
+    """Run call(*args) with its pool checkouts bounded by deadline."""
+    with caller_deadline(deadline):
+        return call(*args)
+
+
+def pool_size():
+    # One connection per fan-out worker: a source call holds at most one, so
+    # calls never queue for a connection while holding a worker. Connections
+    # are opened on demand, so idle workers hold few.
+    return int(os.getenv("DB_POOL_SIZE", source_workers()))
+
+
+class ConnectionPool:
+    """Bounded, thread-safe connection pool shared by schema lookups and query execution.
+
+    connect() opens a new DB-API connection, ping(conn) raises if the
+    connection is unusable and reset(conn) returns it to a clean state before
+    it goes back to the pool.
+    """
+
+    def __init__(self, name, connect, ping, reset, max_size=None, checkout_timeout=None,
+                 health_check_interval=None, max_idle_time=None):
+        self.name = name
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self.max_size = max_size or pool_size()
+        self.checkout_timeout = checkout_timeout or float(os.getenv("DB_POOL_TIMEOUT", 5))
+        self.health_check_interval = health_check_interval if health_check_interval is not None \
+            else float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+        self.max_idle_time = max_idle_time or float(os.getenv("DB_POOL_MAX_IDLE", 600))
+
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = deque()  # (connection, returned_at)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "wait_time_ms_total": 0.0,
+        }
+        self._in_use = 0
+        self._discards = set()  # ids of checked-out connections to close on return
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+
+    def _close(self, conn):
+        self._count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, returned_at = self._idle.pop()
+
+            idle_for = time.monotonic() - returned_at
+            if idle_for > self.max_idle_time:
+                self._close(conn)
+                continue
+            if idle_for >= self.health_check_interval:
+                try:
+                    self._ping(conn)
+                except Exception as e:
+                    logger.warning(f"{self.name} pool: dropping unhealthy connection ({e})")
+                    self._count("health_check_failures")
+                    self._close(conn)
+                    continue
+            return conn
+
+        conn = self._connect()
+        self._count("created")
+        return conn
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection, waiting at most timeout (default: the
+        pool's checkout timeout) and never past the caller's deadline."""
+        started = time.monotonic()
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = _caller_deadline.get()
+        if deadline is not None:
+            timeout = max(min(timeout, deadline - started), 0)
+        if not self._slots.acquire(timeout=timeout):
+            self._count("timeouts")
+            raise PoolExhaustedError(f"{self.name} pool: no connection available after {timeout:.2f}s")
+        self._count("wait_time_ms_total", (time.monotonic() - started) * 1000)
+
+        conn = None
+        checked_out = False
+        try:
+            conn = self._checkout()
+            checked_out = True
+            with self._lock:
+                self._metrics["checkouts"] += 1
+                self._in_use += 1
+            yield conn
+        finally:
+            if conn is not None:
+                with self._lock:
+                    discard = id(conn) in self._discards
+                    self._discards.discard(id(conn))
+                if discard:
+                    self._close(conn)
+                    conn = None
+            if conn is not None:
+                # Also after a failure mid-use: only keep the connection if it can be reset.
+                try:
+                    self._reset(conn)
+                except Exception:
+                    self._close(conn)
+                    conn = None
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            if checked_out:
+                with self._lock:
+                    self._in_use -= 1
+            self._slots.release()
+
+    def discard(self, conn):
+        """Close conn instead of returning it to the pool when its connection()
+        block ends, e.g. while unread rows of a truncated result are still
+        streaming; closing stops the server sending them."""
+        with self._lock:
+            self._discards.add(id(conn))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats.update({"max_size": self.max_size, "in_use": self._in_use, "idle": len(self._idle)})
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(backend, db_config):
+    return (backend, db_config.get("host"), db_config.get("database"), db_config.get("user"))
+
+
+def _get_pool(backend, db_config, factory):
+    key = _pool_key(backend, db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        return pool
+
+
+def register_pool(backend, db_config, pool):
+    """Install a pre-built pool for db_config, e.g. a local stand-in for benchmarks."""
+    with _pools_lock:
+        _pools[_pool_key(backend, db_config)] = pool
+    return pool
+
+
+def get_mysql_pool(mysql_db_config):
+    import mysql.connector
+
+    def ping(conn):
+        conn.ping(reconnect=False)
+
+    return _get_pool("mysql", mysql_db_config, lambda: ConnectionPool(
+        name=f"mysql:{mysql_db_config.get('database')}",
+        connect=lambda: mysql.connector.connect(**mysql_db_config),
+        ping=ping,
+        reset=lambda conn: conn.rollback(),
+    ))
+
+
+def get_postgres_pool(postgresql_db_config):
+    import psycopg2
+
+    def ping(conn):
+        if conn.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+
+    return _get_pool("postgresql", postgresql_db_config, lambda: ConnectionPool(
+        name=f"postgresql:{postgresql_db_config.get('database')}",
+        connect=lambda: psycopg2.connect(**postgresql_db_config),
+        ping=ping,
+        reset=lambda conn: conn.rollback(),
+    ))
+
+
+_async_pools = {}
+_async_pools_lock = None
+
+
+async def _get_async_pool(backend, db_config, factory):
+    # Async pools belong to the event loop that created them; the ASGI app runs
+    # one shared loop per worker, so one pool per backend and database suffices.
+    global _async_pools_lock
+    if _async_pools_lock is None:
+        _async_pools_lock = asyncio.Lock()
+    key = _pool_key(backend, db_config)
+    async with _async_pools_lock:
+        pool = _async_pools.get(key)
+        if pool is None:
+            pool = _async_pools[key] = await factory()
+        return pool
+
+
+async def get_async_mysql_pool(mysql_db_config):
+    import aiomysql
+
+    return await _get_async_pool("mysql", mysql_db_config, lambda: aiomysql.create_pool(
+        host=mysql_db_config.get("host"),
+        user=mysql_db_config.get("user"),
+        password=mysql_db_config.get("password"),
+        db=mysql_db_config.get("database"),
+        minsize=1,
+        maxsize=pool_size(),
+        pool_recycle=float(os.getenv("DB_POOL_MAX_IDLE", 600)),
+        autocommit=True,
+    ))
+
+
+async def get_async_postgres_pool(postgresql_db_config):
+    import asyncpg
+
+    return await _get_async_pool("postgresql", postgresql_db_config, lambda: asyncpg.create_pool(
+        host=postgresql_db_config.get("host"),
+        user=postgresql_db_config.get("user"),
+        password=postgresql_db_config.get("password"),
+        database=postgresql_db_config.get("database"),
+        min_size=1,
+        max_size=pool_size(),
+        max_inactive_connection_lifetime=float(os.getenv("DB_POOL_MAX_IDLE", 600)),
+    ))
+
+
+async def close_async_pools():
+    pools = list(_async_pools.values())
+    _async_pools.clear()
+    for pool in pools:
+        if hasattr(pool, "wait_closed"):
+            pool.close()
+            await pool.wait_closed()
+        else:
+            await pool.close()
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = {pool.name: pool.stats() for pool in pools}
+    for (backend, _, database, _), pool in list(_async_pools.items()):
+        if backend == "mysql":
+            stats[f"async-mysql:{database}"] = {"max_size": pool.maxsize, "size": pool.size, "idle": pool.freesize}
+        else:
+            stats[f"async-postgresql:{database}"] = {
+                "max_size": pool.get_max_size(), "size": pool.get_size(), "idle": pool.get_idle_size()
+            }
+    return stats
+
+
+def _reset_after_fork():
+    # Pre-forked workers must not share sockets with the parent; each child
+    # opens its own connections on first use.
+    global _pools_lock, _async_pools_lock
+    _pools.clear()
+    _async_pools.clear()
+    _pools_lock = threading.Lock()
+    _async_pools_lock = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,212 @@
+import os
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.embeddings import Embeddings
+
+from clients import get_client, set_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+class EmbeddingUnavailable(Exception):
+    """A request-path embedding failed, ran out of time or was skipped because
+    the embedding API failed moments ago."""
+
+
+class EmbeddingCache:
+    """Persistent SQLite cache of embeddings keyed by model name and text hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            """)
+            self.conn.commit()
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model, items):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                [(key, model, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self.conn.commit()
+
+
+class EmbeddingService(Embeddings):
+    """Shared embedding front-end with batching, concurrency, retries and a disk cache.
+
+    Ingestion batches are retried with exponential backoff (max_retries).
+    Calls made while a request waits (embed_query, or embed_documents with
+    interactive=True) get at most query_retries quick retries within
+    query_timeout seconds; once one fails, further interactive calls raise
+    EmbeddingUnavailable without calling the API for failure_ttl seconds.
+
+    Any object exposing embed_documents(texts) can be passed as embedder, which
+    lets the service run against a local fake with no network access.
+    """
+
+    def __init__(self, embedder=None, model=None, batch_size=None, concurrency=None,
+                 max_retries=None, cache_path=None, query_retries=None, query_timeout=None, failure_ttl=None):
+        self.model = model or os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+        self.concurrency = concurrency or int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+        self.query_retries = query_retries if query_retries is not None \
+            else int(os.getenv("EMBEDDING_QUERY_MAX_RETRIES", 1))
+        self.query_timeout = query_timeout or float(os.getenv("EMBEDDING_QUERY_TIMEOUT", 3))
+        self.failure_ttl = failure_ttl if failure_ttl is not None else float(os.getenv("EMBEDDING_FAILURE_TTL", 15))
+        cache_path = cache_path or os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+        self.cache = EmbeddingCache(cache_path) if cache_path != ":none:" else None
+        self._embedder = embedder
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embedding")
+        # Interactive calls never queue behind ingestion batches
+        self._query_executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embedding-query")
+        self._unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.fast_failures = 0
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from langchain_openai import OpenAIEmbeddings
+            # Retries are the service's own; the client only bounds each HTTP call.
+            self._embedder = OpenAIEmbeddings(model=self.model, max_retries=0,
+                                              request_timeout=float(os.getenv("EMBEDDING_REQUEST_TIMEOUT", 30)))
+        return self._embedder
+
+    def _embed_batch(self, texts):
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embedder.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Embedding batch of {len(texts)} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, 30)
+
+    def _embed_and_cache(self, missing):
+        embedded = list(zip(missing, self.embedder.embed_documents(list(missing.values()))))
+        if self.cache:
+            self.cache.put_many(self.model, embedded)
+        return embedded
+
+    def _embed_interactive(self, missing):
+        """[(key, vector)] for the {key: text} in missing, under the request-path policy."""
+        if time.monotonic() < self._unavailable_until:
+            self.fast_failures += 1
+            raise EmbeddingUnavailable("embedding API failed recently; not retrying yet")
+        deadline = time.monotonic() + self.query_timeout
+        for attempt in range(self.query_retries + 1):
+            # A call that runs out of time still finishes in the background
+            # and fills the disk cache for the next request.
+            future = self._query_executor.submit(self._embed_and_cache, missing)
+            try:
+                embedded = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                if attempt == self.query_retries or isinstance(e, FutureTimeoutError) \
+                        or time.monotonic() + 0.2 >= deadline:
+                    self._unavailable_until = time.monotonic() + self.failure_ttl
+                    reason = f"no response within {self.query_timeout}s" if isinstance(e, FutureTimeoutError) else e
+                    logger.warning(f"Embedding of {len(missing)} texts for a request failed ({reason}); "
+                                   f"skipping request-path embeddings for {self.failure_ttl}s")
+                    raise EmbeddingUnavailable(str(reason)) from e
+                time.sleep(0.2)
+            else:
+                self._unavailable_until = 0.0
+                return embedded
+
+    def embed_documents(self, texts, interactive=False):
+        """Embed texts, serving cached vectors from disk.
+
+        interactive=True applies the bounded request-path policy instead of
+        the ingestion retries; see the class docstring.
+        """
+        texts = list(texts)
+        keys = [EmbeddingCache.key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(set(keys)) if self.cache else {}
+
+        # Deduplicate so repeated texts within one call are embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing and interactive:
+            vectors.update(self._embed_interactive(missing))
+        elif missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+            futures = [self._executor.submit(self._embed_batch, [missing[key] for key in batch]) for batch in batches]
+            for batch, future in zip(batches, futures):
+                embedded = list(zip(batch, future.result()))
+                vectors.update(embedded)
+                if self.cache:
+                    self.cache.put_many(self.model, embedded)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        # Queries are only embedded while a request waits
+        return self.embed_documents([text], interactive=True)[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fast_failures": self.fast_failures,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def get_embedding_service():
+    return get_client("embeddings", EmbeddingService)
+
+
+def set_embedding_service(service):
+    """Replace the shared service, e.g. with one wrapping a local fake embedder.
+
+    Must run before the processors are constructed; they keep the instance
+    they were given.
+    """
+    set_client("embeddings", service)
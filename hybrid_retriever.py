@@ -0,0 +1,238 @@
+import os
+import re
+import math
+import pickle
+import asyncio
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[-./][a-z0-9_]+)*")
+
+
+def tokenize(text):
+    """Lowercased tokens; identifiers such as SKU-1234 or event_amount are kept
+    whole and also split into their parts so partial mentions still match."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-./_]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def is_identifier(token):
+    return any(ch.isdigit() for ch in token) or any(ch in "-./_" for ch in token)
+
+
+def chunk_key(doc):
+    return doc.metadata.get("chunk_id") or hashlib.md5(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """Incrementally maintained inverted index with Okapi BM25 scoring."""
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path or os.getenv("BM25_INDEX_PATH", "bm25_index.pkl")
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self.postings = {}  # term -> {chunk_id: term frequency}
+        self.doc_lengths = {}
+        self.docs = {}  # chunk_id -> (text, metadata)
+        self.total_length = 0
+        self.loaded_mtime = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.docs
+
+    def clear(self):
+        with self.lock:
+            self.postings, self.doc_lengths, self.docs, self.total_length = {}, {}, {}, 0
+
+    def add(self, chunk_id, text, metadata=None):
+        with self.lock:
+            self.remove(chunk_id)
+            tokens = tokenize(text)
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                self.postings.setdefault(token, {})[chunk_id] = frequency
+            self.doc_lengths[chunk_id] = len(tokens)
+            self.total_length += len(tokens)
+            self.docs[chunk_id] = (text, dict(metadata or {}))
+
+    def add_documents(self, documents, ids):
+        for doc, chunk_id in zip(documents, ids):
+            self.add(chunk_id, doc.page_content, doc.metadata)
+
+    def remove(self, chunk_id):
+        with self.lock:
+            if chunk_id not in self.docs:
+                return
+            text, _ = self.docs.pop(chunk_id)
+            for token in set(tokenize(text)):
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[token]
+            self.total_length -= self.doc_lengths.pop(chunk_id, 0)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.remove(chunk_id)
+
+    def search(self, query, k=20, filter=None):
+        """Return [(Document, score), ...] for the k best BM25 matches."""
+        with self.lock:
+            n = len(self.docs)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            scores = {}
+            for token in set(tokenize(query)):
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            for chunk_id, score in ranked:
+                text, metadata = self.docs[chunk_id]
+                if filter and any(metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                metadata = dict(metadata, chunk_id=chunk_id)
+                results.append((Document(page_content=text, metadata=metadata), score))
+                if len(results) >= k:
+                    break
+            return results
+
+    def save(self):
+        with self.lock:
+            state = (self.postings, self.doc_lengths, self.docs, self.total_length)
+            with open(self.path + ".tmp", "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+        self.loaded_mtime = os.path.getmtime(self.path)
+
+    def refresh(self):
+        """Reload from disk if another process (e.g. an ingestion run) saved a newer index."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return self
+        if mtime != self.loaded_mtime:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            with self.lock:
+                self.postings, self.doc_lengths, self.docs, self.total_length = state
+                self.loaded_mtime = mtime
+            logger.info(f"Loaded BM25 index with {len(self.docs)} chunks from {self.path}")
+        return self
+
+    @classmethod
+    def load(cls, path=None):
+        return cls(path).refresh()
+
+
+class HybridRetriever:
+    """Fuses vector and BM25 results with reciprocal rank fusion, then re-ranks.
+
+    The re-ranking stage is local and makes no embedding calls: it scores the
+    fused candidates by the cosine similarity the vector store returned for
+    them (the fused score stands in for chunks found only by BM25) plus
+    coverage of identifier-like query terms, and keeps only the best k
+    chunks for the summary prompt.
+    """
+
+    def __init__(self, vectorstore, bm25_index, k=None, vector_k=None, lexical_k=None,
+                 rrf_k=None, rerank_candidates=None):
+        self.vectorstore = vectorstore
+        self.bm25_index = bm25_index
+        self.k = k or int(os.getenv("RETRIEVAL_K", 3))
+        self.vector_k = vector_k or int(os.getenv("RETRIEVAL_VECTOR_K", 20))
+        self.lexical_k = lexical_k or int(os.getenv("RETRIEVAL_LEXICAL_K", 20))
+        self.rrf_k = rrf_k or int(os.getenv("RETRIEVAL_RRF_K", 60))
+        self.rerank_candidates = rerank_candidates or int(os.getenv("RETRIEVAL_RERANK_CANDIDATES", 20))
+
+    def fuse(self, *ranked_lists):
+        scores, docs = {}, {}
+        for ranked in ranked_lists:
+            for rank, doc in enumerate(ranked):
+                key = chunk_key(doc)
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        ranked_keys = sorted(scores, key=scores.get, reverse=True)[:self.rerank_candidates]
+        return [(docs[key], scores[key]) for key in ranked_keys]
+
+    def rerank(self, query, candidates, similarities=None):
+        """similarities maps chunk keys to the vector store's query similarity."""
+        if not candidates:
+            return []
+        similarities = similarities or {}
+        texts = [doc.page_content for doc, _ in candidates]
+        fused = np.array([score for _, score in candidates])
+        fused = fused / fused.max()
+        similarity = np.array([similarities.get(chunk_key(doc), fused[i]) for i, (doc, _) in enumerate(candidates)])
+
+        identifiers = {token for token in tokenize(query) if is_identifier(token)}
+        coverage = np.array([
+            len(identifiers & set(tokenize(text))) / len(identifiers) if identifiers else 0.0
+            for text in texts
+        ])
+
+        final = 0.5 * similarity + 0.3 * fused + 0.2 * coverage
+        order = np.argsort(-final)[:self.k]
+        return [candidates[i][0] for i in order]
+
+    def _rerank_timed(self, query, vector_hits, lexical_docs):
+        with timed("vector.rerank"):
+            vector_docs = [doc for doc, _ in vector_hits]
+            similarities = {chunk_key(doc): score for doc, score in vector_hits}
+            return self.rerank(query, self.fuse(vector_docs, lexical_docs), similarities)
+
+    def refresh(self):
+        # Pick up an ingestion run by another process: the BM25 index and, for
+        # the local backend, the persisted vectors are reloaded once changed.
+        self.bm25_index.refresh()
+        refresh_vectors = getattr(self.vectorstore, "refresh", None)
+        if refresh_vectors is not None:
+            refresh_vectors()
+
+    def _lexical_search(self, query, filter=None):
+        return [doc for doc, _ in self.bm25_index.search(query, k=self.lexical_k, filter=filter)]
+
+    def invoke(self, query, filter=None):
+        self.refresh()
+        with timed("vector.search"):
+            vector_hits = self.vectorstore.similarity_search_with_score(query, k=self.vector_k, filter=filter)
+        with timed("vector.bm25"):
+            lexical_docs = self._lexical_search(query, filter)
+        return self._rerank_timed(query, vector_hits, lexical_docs)
+
+    async def ainvoke(self, query, filter=None):
+        # Reloading the indexes after an ingestion and BM25 scoring are
+        # CPU-bound; both run off the event loop. The rerank makes no calls and is cheap.
+        await asyncio.to_thread(self.refresh)
+        with timed("vector.search"):
+            vector_hits = await self.vectorstore.asimilarity_search_with_score(query, k=self.vector_k, filter=filter)
+        with timed("vector.bm25"):
+            lexical_docs = await asyncio.to_thread(self._lexical_search, query, filter)
+        return self._rerank_timed(query, vector_hits, lexical_docs)
@@ -0,0 +1,312 @@
+import os
+import json
+import uuid
+import logging
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index over float32 NumPy matrices.
+
+    Vectors are L2-normalised on insert so cosine similarity is a single
+    matrix product. Small corpora are searched exactly; once the store holds
+    ivf_threshold vectors an inverted-file (IVF) index over k-means centroids
+    restricts each search to the nprobe closest lists. Deletes are tombstoned
+    and compacted on persist(). The matrix is reloaded memory-mapped, and
+    refresh() reloads it once another process persists a newer store.
+    """
+
+    def __init__(self, embedding, path=None, ivf_threshold=None, nprobe=None):
+        self.embedding = embedding
+        self.path = path or os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store")
+        self.ivf_threshold = ivf_threshold or int(os.getenv("LOCAL_VECTOR_IVF_THRESHOLD", 50000))
+        self.nprobe = nprobe or int(os.getenv("LOCAL_VECTOR_NPROBE", 8))
+        self.lock = threading.RLock()
+
+        self.vectors = None  # (capacity, dim) float32, rows [0, count) in use
+        self.count = 0
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.row_by_id = {}
+        self.rows_by_filename = {}
+
+        self.centroids = None
+        self.assignments = None  # row -> IVF list
+        self.loaded_mtime = None  # of metadata.json, written last by persist()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # -- storage -----------------------------------------------------------
+
+    @staticmethod
+    def _normalize(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _reserve(self, extra, dim):
+        needed = self.count + extra
+        if self.vectors is None:
+            self.vectors = np.zeros((max(needed, 1024), dim), dtype=np.float32)
+            self.alive = np.zeros(len(self.vectors), dtype=bool)
+        elif needed > len(self.vectors) or not self.vectors.flags.writeable:
+            # Grow geometrically; this also copies a read-only memory map into RAM.
+            capacity = max(needed, 2 * len(self.vectors)) if needed > len(self.vectors) else len(self.vectors)
+            vectors = np.zeros((capacity, dim), dtype=np.float32)
+            vectors[:self.count] = self.vectors[:self.count]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self.count] = self.alive[:self.count]
+            self.vectors, self.alive = vectors, alive
+
+    def _index_row(self, row):
+        filename = self.metadatas[row].get("filename")
+        if filename is not None:
+            self.rows_by_filename.setdefault(filename, set()).add(row)
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        vectors = self._normalize(vectors)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        with self.lock:
+            self.delete(ids=[i for i in ids if i in self.row_by_id])
+            self._reserve(len(ids), vectors.shape[1])
+            start = self.count
+            self.vectors[start:start + len(ids)] = vectors
+            self.alive[start:start + len(ids)] = True
+            for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self.ids.append(chunk_id)
+                self.texts.append(text)
+                self.metadatas.append(dict(metadata))
+                self.row_by_id[chunk_id] = start + offset
+                self._index_row(start + offset)
+            self.count += len(ids)
+
+            if self.centroids is not None:
+                new_assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+                self.assignments = np.concatenate([self.assignments[:start], new_assignments])
+            elif self.live_count() >= self.ivf_threshold:
+                self.build_ivf()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        with self.lock:
+            for chunk_id in ids or []:
+                row = self.row_by_id.pop(chunk_id, None)
+                if row is None:
+                    continue
+                self.alive[row] = False
+                filename = self.metadatas[row].get("filename")
+                if filename in self.rows_by_filename:
+                    self.rows_by_filename[filename].discard(row)
+        return True
+
+    def live_count(self):
+        return len(self.row_by_id)
+
+    # -- approximate index -------------------------------------------------
+
+    def build_ivf(self, nlist=None, iterations=10, sample_size=100000):
+        """Cluster live vectors with k-means and assign every row to a list."""
+        with self.lock:
+            live_rows = np.flatnonzero(self.alive[:self.count])
+            if len(live_rows) == 0:
+                return
+            nlist = nlist or max(1, int(np.sqrt(len(live_rows))))
+            rng = np.random.default_rng(0)
+            sample = self.vectors[rng.choice(live_rows, size=min(sample_size, len(live_rows)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = sample[labels == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = self._normalize(centroids)
+
+            self.centroids = centroids
+            self.assignments = np.argmax(self.vectors[:self.count] @ centroids.T, axis=1)
+            logger.info(f"Built IVF index with {len(centroids)} lists over {len(live_rows)} vectors")
+
+    # -- search ------------------------------------------------------------
+
+    def _candidate_mask(self, filter=None):
+        mask = self.alive[:self.count].copy()
+        for key, condition in (filter or {}).items():
+            # Accepts {"filename": "a.pdf"} as well as Pinecone-style $eq / $in.
+            if isinstance(condition, dict):
+                values = condition["$in"] if "$in" in condition else [condition.get("$eq")]
+            else:
+                values = [condition]
+            if key == "filename":
+                rows = set().union(*(self.rows_by_filename.get(v, set()) for v in values)) if values else set()
+                key_mask = np.zeros(self.count, dtype=bool)
+                key_mask[list(rows)] = True
+            else:
+                key_mask = np.array([m.get(key) in values for m in self.metadatas[:self.count]], dtype=bool)
+            mask &= key_mask
+        return mask
+
+    def search_vectors(self, query_vectors, k=4, filter=None, exact=False):
+        """Batched cosine search; returns one [(row, score), ...] list per query."""
+        queries = self._normalize(np.atleast_2d(query_vectors))
+        with self.lock:
+            if self.count == 0:
+                return [[] for _ in queries]
+            mask = self._candidate_mask(filter)
+            results = []
+
+            if self.centroids is None or exact:
+                rows = np.flatnonzero(mask)
+                scores = queries @ self.vectors[rows].T if len(rows) else np.zeros((len(queries), 0))
+                for query_scores in scores:
+                    results.append(self._top_k(rows, query_scores, k))
+                return results
+
+            centroid_scores = queries @ self.centroids.T
+            for query, query_centroids in zip(queries, centroid_scores):
+                lists = np.argpartition(-query_centroids, min(self.nprobe, len(self.centroids)) - 1)[:self.nprobe]
+                rows = np.flatnonzero(mask & np.isin(self.assignments, lists))
+                results.append(self._top_k(rows, self.vectors[rows] @ query, k))
+            return results
+
+    @staticmethod
+    def _top_k(rows, scores, k):
+        if len(rows) == 0:
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _document(self, row):
+        metadata = dict(self.metadatas[row])
+        metadata.setdefault("chunk_id", self.ids[row])
+        return Document(page_content=self.texts[row], metadata=metadata)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        # Rows are only meaningful until the next refresh()
+        with self.lock:
+            hits = self.search_vectors([embedding], k=k, filter=filter)[0]
+            return [(self._document(row), score) for row, score in hits]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    # -- persistence -------------------------------------------------------
+
+    def persist(self, path=None):
+        """Compact tombstones and write vectors, metadata and IVF state to path."""
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self.lock:
+            live_rows = np.flatnonzero(self.alive[:self.count]) if self.count else np.zeros(0, dtype=int)
+            vectors = self.vectors[live_rows] if self.count else np.zeros((0, 0), dtype=np.float32)
+            np.save(os.path.join(path, "vectors.tmp.npy"), vectors)
+            os.replace(os.path.join(path, "vectors.tmp.npy"), os.path.join(path, "vectors.npy"))
+
+            ivf_path = os.path.join(path, "ivf.npz")
+            if self.centroids is not None:
+                np.savez(ivf_path, centroids=self.centroids, assignments=self.assignments[live_rows])
+            elif os.path.exists(ivf_path):
+                os.remove(ivf_path)
+
+            # metadata.json goes last: readers treat it as the version of the store.
+            meta = {
+                "ids": [self.ids[row] for row in live_rows],
+                "texts": [self.texts[row] for row in live_rows],
+                "metadatas": [self.metadatas[row] for row in live_rows],
+            }
+            meta_path = os.path.join(path, "metadata.json")
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            if path == self.path:
+                self.loaded_mtime = os.path.getmtime(meta_path)
+        logger.info(f"Persisted {len(live_rows)} vectors to {path}")
+
+    def _load_files(self):
+        """Replace this store's contents with the persisted store; False if
+        there is none yet or persist() is still writing it."""
+        meta_path = os.path.join(self.path, "metadata.json")
+        try:
+            mtime = os.path.getmtime(meta_path)
+            vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            ivf_path = os.path.join(self.path, "ivf.npz")
+            ivf = np.load(ivf_path) if os.path.exists(ivf_path) else None
+        except Exception as e:  # missing or half-written files
+            logger.warning(f"Could not load the vector store at {self.path}: {e}")
+            return False
+
+        count = len(meta["ids"])
+        centroids, assignments = (ivf["centroids"], ivf["assignments"]) if ivf is not None else (None, None)
+        if (count and len(vectors) != count) or (assignments is not None and len(assignments) != count):
+            return False
+
+        row_by_id = {chunk_id: row for row, chunk_id in enumerate(meta["ids"])}
+        rows_by_filename = {}
+        for row, metadata in enumerate(meta["metadatas"]):
+            if metadata.get("filename") is not None:
+                rows_by_filename.setdefault(metadata["filename"], set()).add(row)
+
+        with self.lock:
+            self.count = count
+            self.vectors = vectors if count else None
+            self.alive = np.ones(count, dtype=bool)
+            self.ids, self.texts, self.metadatas = meta["ids"], meta["texts"], meta["metadatas"]
+            self.row_by_id, self.rows_by_filename = row_by_id, rows_by_filename
+            self.centroids, self.assignments = centroids, assignments
+            self.loaded_mtime = mtime
+        logger.info(f"Loaded {count} vectors from {self.path}")
+        return True
+
+    def refresh(self):
+        """Reload from disk if another process (e.g. an ingestion run) persisted a newer store."""
+        try:
+            mtime = os.path.getmtime(os.path.join(self.path, "metadata.json"))
+        except OSError:
+            return self
+        if mtime != self.loaded_mtime:
+            self._load_files()
+        return self
+
+    @classmethod
+    def load(cls, embedding, path=None, **kwargs):
+        store = cls(embedding, path=path, **kwargs)
+        return store.refresh()
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
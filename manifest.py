@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".csv")
+
+
+def file_digest(path, block_size=1 << 20):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def chunk_ids_for(relpath, file_hash, count):
+    # Deterministic IDs: re-ingesting the same file content always produces the
+    # same vector IDs, so upserts overwrite instead of duplicating.
+    return [hashlib.md5(f"{relpath}:{file_hash}:{i}".encode("utf-8")).hexdigest() for i in range(count)]
+
+
+def scan_directory(directory_path):
+    files = {}
+    for root, _, names in os.walk(directory_path):
+        for name in names:
+            if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, directory_path).replace("\\", "/")
+            files[relpath] = path
+    return files
+
+
+_version_cache = {}  # path -> (mtime, version)
+
+
+def current_version(version_path=None):
+    """Version digest of the last completed ingestion, as written to the
+    version file; re-read only when the file changes. None before any run."""
+    version_path = version_path or os.getenv("MANIFEST_VERSION_PATH", "processed_files.txt")
+    try:
+        mtime = os.path.getmtime(version_path)
+    except OSError:
+        return None
+    cached = _version_cache.get(version_path)
+    if cached is None or cached[0] != mtime:
+        with open(version_path, "r", encoding="utf-8") as f:
+            cached = _version_cache[version_path] = (mtime, f.read().strip())
+    return cached[1]
+
+
+class IngestionManifest:
+    """Per-file record of content hash, mtime, size and vector chunk IDs.
+
+    target identifies the vector store the chunks were written to (backend
+    and index); a manifest written for another target, or for none, is
+    ignored, so every file is ingested again into the new one.
+    """
+
+    def __init__(self, manifest_path=None, version_path=None, target=None):
+        self.manifest_path = manifest_path or os.getenv("MANIFEST_PATH", "ingestion_manifest.json")
+        self.version_path = version_path or os.getenv("MANIFEST_VERSION_PATH", "processed_files.txt")
+        self.target = target
+        self.files = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if self.target is not None and data.get("target") != self.target:
+                logger.warning(f"Manifest {self.manifest_path} was written for {data.get('target')}, "
+                               f"not {self.target}; ingesting every file again")
+                self.files = {}
+            else:
+                self.files = data.get("files", {})
+        return self
+
+    def reset(self):
+        self.files = {}
+
+    def save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version(), "target": self.target, "files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+        with open(self.version_path, "w", encoding="utf-8") as f:
+            f.write(self.version() + "\n")
+
+    def version(self):
+        md5 = hashlib.md5()
+        for relpath in sorted(self.files):
+            md5.update(f"{relpath}:{self.files[relpath]['hash']}\n".encode("utf-8"))
+        return md5.hexdigest()
+
+    def diff(self, current_files):
+        """Split current files into (changed, unchanged, deleted).
+
+        changed holds (relpath, path, file_hash) for new or modified files.
+        Files whose size and mtime match the manifest are not re-hashed.
+        """
+        changed, unchanged = [], []
+        for relpath, path in sorted(current_files.items()):
+            stat = os.stat(path)
+            entry = self.files.get(relpath)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                unchanged.append(relpath)
+                continue
+
+            file_hash = file_digest(path)
+            if entry and entry["hash"] == file_hash:
+                entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+                unchanged.append(relpath)
+            else:
+                changed.append((relpath, path, file_hash))
+
+        deleted = [relpath for relpath in self.files if relpath not in current_files]
+        return changed, unchanged, deleted
+
+    def record(self, relpath, path, file_hash, chunk_ids):
+        stat = os.stat(path)
+        self.files[relpath] = {
+            "hash": file_hash,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunk_ids": chunk_ids,
+        }
+
+    def chunk_ids(self, relpath):
+        entry = self.files.get(relpath)
+        return entry["chunk_ids"] if entry else []
+
+    def remove(self, relpath):
+        return self.files.pop(relpath, {}).get("chunk_ids", [])
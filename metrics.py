@@ -0,0 +1,184 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Loaded on first use: on a cold cache tiktoken downloads the BPE file, which
+# must not happen at import time. None until loaded, False if unavailable.
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:  # tiktoken is optional; fall back to a character estimate
+                    _encoding = False
+    return _encoding
+
+
+def estimate_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for key, value in labels)
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {round(series[-2], 3)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Process-wide metrics in Prometheus text exposition format.
+
+    Collectors are callables returning (name, type, help, labels, value)
+    tuples; they are evaluated on every scrape, which suits values owned by
+    other components such as cache hit ratios and pool sizes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+
+    def counter(self, name, help):
+        with self.lock:
+            return self.metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS_MS):
+        with self.lock:
+            return self.metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def register_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        collected = {}
+        for collector in collectors:
+            for name, metric_type, help, labels, value in collector():
+                collected.setdefault((name, metric_type, help), []).append((tuple(sorted(labels.items())), value))
+        for (name, metric_type, help), samples in collected.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {metric_type}"])
+            lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.histogram("datamind_stage_latency_ms", "Latency of pipeline stages in milliseconds")
+LLM_TOKENS = REGISTRY.counter("datamind_llm_tokens_total", "Estimated LLM tokens by stage and kind")
+DB_ROWS = REGISTRY.counter("datamind_db_rows_total", "Rows returned by generated SQL queries")
+REQUESTS = REGISTRY.counter("datamind_requests_total", "Handled /query requests by endpoint and status")
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Collect every stage timed within this context into one dict.
+
+    Context variables follow asyncio tasks automatically; thread-pool work has
+    to be submitted through contextvars.copy_context().run to be included.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def observe_stage(stage, elapsed_ms, timings=None):
+    STAGE_LATENCY.observe(elapsed_ms, stage=stage)
+    for target in (timings, _request_timings.get()):
+        if target is not None:
+            target[stage] = round(target.get(stage, 0) + elapsed_ms, 2)
+
+
+@contextmanager
+def timed(stage, timings=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, (time.perf_counter() - start) * 1000, timings)
+
+
+def record_tokens(stage, prompt_text, completion_text):
+    LLM_TOKENS.inc(estimate_tokens(prompt_text), stage=stage, kind="prompt")
+    LLM_TOKENS.inc(estimate_tokens(completion_text), stage=stage, kind="completion")
+
+
+def record_rows(source, result):
+    DB_ROWS.inc(result.get("row_count", 0) if isinstance(result, dict) else len(result), source=source)
@@ -1,68 +1,122 @@
-import psycopg2
-from psycopg2 import pool, Error as PostgresError
-
-def get_postgres_schema(postgresql_db_config):
-    schema_info = ""
-    table_names = set()
-    column_names = set()
-    try:
-        conn = psycopg2.connect(**postgresql_db_config)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-        """)
-        tables = cursor.fetchall()
-
-        for table in tables:
-            table_name = table[0]
-            table_names.add(table_name.lower())
-            schema_info += f"Table: {table_name}\n"
-            cursor.execute(f"""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name = '{table_name}'
-            """)
-            columns = cursor.fetchall()
-            for column in columns:
-                column_names.add(column[0].lower())
-                schema_info += f" - {column[0]} ({column[1]})\n"
-
-            # Fetch primary key
-            cursor.execute(f"""
-                SELECT kcu.column_name
-                FROM information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                ON tc.constraint_name = kcu.constraint_name
-                AND tc.table_name = kcu.table_name
-                WHERE tc.table_name = '{table_name}' AND tc.constraint_type = 'PRIMARY KEY'
-            """)
-            primary_keys = cursor.fetchall()
-            if primary_keys:
-                schema_info += " - Primary Key:\n"
-                for pk in primary_keys:
-                    schema_info += f"   - {pk[0]}\n"
-
-            # Fetch foreign key relationships
-            cursor.execute(f"""
-                SELECT kcu.column_name, ccu.table_name AS foreign_table_name, ccu.column_name AS foreign_column_name
-                FROM information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                ON ccu.constraint_name = tc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name='{table_name}'
-            """)
-            foreign_keys = cursor.fetchall()
-            if foreign_keys:
-                schema_info += " - Foreign Keys:\n"
-                for fk in foreign_keys:
-                    schema_info += f"   - {fk[0]} -> {fk[1]}({fk[2]})\n"
-
-        cursor.close()
-        conn.close()
-    except PostgresError as err:
-        print(f"Error: {err}")
-
-    return schema_info, table_names, column_names
\ No newline at end of file
+from psycopg2 import Error as PostgresError
+from schema_cache import schema_cache, cache_key
+from db_pool import get_postgres_pool
+
+COLUMNS_QUERY = """
+    SELECT c.table_name, c.column_name, c.data_type
+    FROM information_schema.columns AS c
+    JOIN information_schema.tables AS t
+    ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'public'
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+KEYS_QUERY = """
+    SELECT tc.table_name, tc.constraint_type, kcu.column_name,
+           ccu.table_name AS foreign_table_name, ccu.column_name AS foreign_column_name
+    FROM information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+    ON tc.constraint_name = kcu.constraint_name
+    AND tc.table_schema = kcu.table_schema
+    AND tc.table_name = kcu.table_name
+    LEFT JOIN information_schema.constraint_column_usage AS ccu
+    ON tc.constraint_type = 'FOREIGN KEY'
+    AND ccu.constraint_name = tc.constraint_name
+    AND ccu.constraint_schema = tc.constraint_schema
+    WHERE tc.table_schema = 'public' AND tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY')
+    ORDER BY tc.table_name, kcu.ordinal_position
+"""
+
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT md5(COALESCE(string_agg(c.relname || '.' || a.attname || ':' || a.atttypid::text, ','
+                                        ORDER BY c.relname, a.attnum), ''))
+         FROM pg_catalog.pg_attribute AS a
+         JOIN pg_catalog.pg_class AS c ON c.oid = a.attrelid
+         WHERE c.relnamespace = 'public'::regnamespace
+           AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+           AND a.attnum > 0 AND NOT a.attisdropped),
+        (SELECT md5(COALESCE(string_agg(con.conname || ':' || pg_get_constraintdef(con.oid), ','
+                                        ORDER BY con.conname), ''))
+         FROM pg_catalog.pg_constraint AS con
+         WHERE con.connamespace = 'public'::regnamespace AND con.contype IN ('p', 'f'))
+"""
+
+
+def load_postgres_schema(cursor):
+    tables = {}
+    cursor.execute(COLUMNS_QUERY)
+    for table_name, column_name, data_type in cursor.fetchall():
+        table = tables.setdefault(table_name, {"columns": [], "primary_key": [], "foreign_keys": []})
+        table["columns"].append((column_name, data_type))
+
+    cursor.execute(KEYS_QUERY)
+    for table_name, constraint_type, column_name, foreign_table, foreign_column in cursor.fetchall():
+        table = tables.get(table_name)
+        if table is None:
+            continue
+        if constraint_type == 'PRIMARY KEY':
+            table["primary_key"].append(column_name)
+        else:
+            table["foreign_keys"].append((column_name, foreign_table, foreign_column))
+    return tables
+
+
+def render_postgres_schema(tables):
+    schema_info = ""
+    for table_name, table in tables.items():
+        schema_info += f"Table: {table_name}\n"
+        for column_name, data_type in table["columns"]:
+            schema_info += f" - {column_name} ({data_type})\n"
+        if table["primary_key"]:
+            schema_info += " - Primary Key:\n"
+            for pk in table["primary_key"]:
+                schema_info += f"   - {pk}\n"
+        if table["foreign_keys"]:
+            schema_info += " - Foreign Keys:\n"
+            for column_name, foreign_table, foreign_column in table["foreign_keys"]:
+                schema_info += f"   - {column_name} -> {foreign_table}({foreign_column})\n"
+    return schema_info
+
+
+def get_postgres_schema_entry(postgresql_db_config):
+    def query(fn):
+        with get_postgres_pool(postgresql_db_config).connection() as conn:
+            with conn.cursor() as cursor:
+                return fn(cursor)
+
+    def load():
+        tables = query(load_postgres_schema)
+        return {
+            "tables": tables,
+            "schema_info": render_postgres_schema(tables),
+            "table_names": {name.lower() for name in tables},
+            "column_names": {column.lower() for table in tables.values() for column, _ in table["columns"]},
+        }
+
+    def fingerprint():
+        def fetch(cursor):
+            cursor.execute(FINGERPRINT_QUERY)
+            return "/".join(cursor.fetchone())
+        return query(fetch)
+
+    return schema_cache.get(cache_key("postgresql", postgresql_db_config), load, fingerprint)
+
+
+def peek_postgres_schema(postgresql_db_config):
+    return schema_cache.peek(cache_key("postgresql", postgresql_db_config))
+
+
+def get_postgres_schema_fingerprint(postgresql_db_config):
+    entry = peek_postgres_schema(postgresql_db_config)
+    return entry["fingerprint"] if entry else None
+
+
+def get_postgres_schema(postgresql_db_config):
+    try:
+        entry = get_postgres_schema_entry(postgresql_db_config)
+    except PostgresError as err:
+        print(f"Error: {err}")
+        return "", set(), set()
+
+    return entry["schema_info"], entry["table_names"], entry["column_names"]
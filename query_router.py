@@ -0,0 +1,146 @@
+import os
+import math
+import logging
+
+from hybrid_retriever import tokenize
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "were", "be", "by",
+    "with", "what", "which", "who", "how", "me", "show", "give", "list", "all", "from", "that", "this",
+    "it", "do", "does", "did", "can", "i", "we", "our", "my", "please", "about", "tell", "there", "at",
+}
+
+# Cue words for the small local prior: aggregate/tabular wording leans SQL,
+# descriptive wording leans towards the document store.
+SQL_CUES = {
+    "total", "sum", "count", "average", "avg", "max", "maximum", "min", "minimum", "top", "per", "number",
+    "many", "much", "highest", "lowest", "rank", "group", "monthly", "yearly", "daily", "between", "latest",
+}
+DOCUMENT_CUES = {
+    "explain", "describe", "summary", "summarize", "policy", "policies", "document", "documents", "report",
+    "pdf", "why", "guideline", "guidelines", "procedure", "meaning", "definition", "overview",
+}
+
+
+def singular(token):
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def word_forms(token):
+    """The token, its singular and its plural, for matching an unnormalized
+    vocabulary such as the BM25 postings."""
+    base = singular(token)
+    plural = base[:-1] + "ies" if base.endswith("y") and base[-2:-1] not in "aeiou" else base + "s"
+    return {token, base, plural}
+
+
+class SchemaTermIndex:
+    """Weighted lookup of table names, column names and their snake_case parts."""
+
+    TABLE_WEIGHT = 1.0
+    COLUMN_WEIGHT = 0.7
+    PART_WEIGHT = 0.25
+
+    def __init__(self, table_names, column_names):
+        self.table_names = table_names
+        self.column_names = column_names
+        self.terms = {}
+        for names, weight in ((column_names, self.COLUMN_WEIGHT), (table_names, self.TABLE_WEIGHT)):
+            for name in names:
+                self._add(singular(name.lower()), weight)
+                for part in name.lower().split("_"):
+                    if part and part not in STOPWORDS and len(part) > 2:
+                        self._add(singular(part), self.PART_WEIGHT)
+
+    def _add(self, term, weight):
+        self.terms[term] = max(self.terms.get(term, 0.0), weight)
+
+    def score(self, tokens):
+        return sum(self.terms.get(token, 0.0) for token in tokens)
+
+
+class QueryRouter:
+    """Decides which backends a question needs and how confident that choice is.
+
+    SQL sources are scored against term indexes built from the schema table
+    and column names; the vector source against the BM25 vocabulary of the
+    ingested chunks. A small cue-word prior nudges both. Only one SQL backend
+    runs unless the two are within sql_margin of each other.
+    """
+
+    def __init__(self, min_confidence=None, sql_margin=None):
+        self.min_confidence = min_confidence if min_confidence is not None \
+            else float(os.getenv("ROUTER_MIN_CONFIDENCE", 0.35))
+        self.sql_margin = sql_margin if sql_margin is not None else float(os.getenv("ROUTER_SQL_MARGIN", 0.15))
+        self.term_indexes = {}
+
+    def _term_index(self, source, table_names, column_names):
+        index = self.term_indexes.get(source)
+        # The schema cache hands out the same set objects until the schema changes.
+        if index is None or index.table_names is not table_names or index.column_names is not column_names:
+            index = self.term_indexes[source] = SchemaTermIndex(table_names, column_names)
+        return index
+
+    @staticmethod
+    def _confidence(score):
+        return round(1 - math.exp(-score), 3)
+
+    @staticmethod
+    def _vector_score(tokens, bm25_index):
+        if bm25_index is None or not len(bm25_index):
+            return None
+        n = len(bm25_index)
+        score = 0.0
+        for token in tokens:
+            # The postings hold raw tokens, so "invoice" must also find "invoices".
+            counts = [len(bm25_index.postings.get(form, ())) for form in word_forms(token)]
+            document_count = max(counts)
+            if document_count:
+                # Rare terms that exist in the corpus are strong evidence.
+                score += min(1.0, math.log(1 + n / document_count) / math.log(1 + n))
+        return score
+
+    def route(self, user_query, schema_terms, bm25_index=None):
+        """Return {source: {"confidence": float, "selected": bool}}.
+
+        schema_terms maps each SQL source name to its (table_names, column_names).
+        """
+        tokens = [singular(token) for token in tokenize(user_query) if token not in STOPWORDS]
+        sql_prior = 0.3 * sum(1 for token in tokens if token in SQL_CUES)
+        document_prior = 0.3 * sum(1 for token in tokens if token in DOCUMENT_CUES)
+
+        confidences = {}
+        for source, (table_names, column_names) in schema_terms.items():
+            schema_score = self._term_index(source, table_names, column_names).score(tokens)
+            confidences[source] = self._confidence(schema_score + (sql_prior if schema_score else 0.0))
+
+        vector_score = self._vector_score(tokens, bm25_index)
+        # Without a lexical index there is no evidence either way; keep vector
+        # retrieval on, it is the cheapest source.
+        confidences["vector"] = 0.5 if vector_score is None else self._confidence(vector_score * 0.5 + document_prior)
+
+        selected = {source for source, confidence in confidences.items() if confidence >= self.min_confidence}
+
+        sql_sources = sorted(schema_terms, key=lambda source: confidences[source], reverse=True)
+        chosen_sql = [source for source in sql_sources if source in selected]
+        if len(chosen_sql) > 1:
+            best = confidences[chosen_sql[0]]
+            selected -= {source for source in chosen_sql[1:] if best - confidences[source] > self.sql_margin}
+
+        if not selected:
+            # Nothing stands out: answer from documents, plus the SQL backend
+            # with any schema overlap at all.
+            selected.add("vector")
+            if sql_sources and confidences[sql_sources[0]] > 0:
+                selected.add(sql_sources[0])
+
+        routing = {source: {"confidence": confidence, "selected": source in selected}
+                   for source, confidence in confidences.items()}
+        logger.info(f"Query routing: {routing}")
+        return routing
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+# Row-limiting clauses a generated query may already end with; "count" is the row count
+_TRAILING_LIMITS = (
+    re.compile(r"\blimit\s+(?P<count>\d+|all)(?:\s+offset\s+\d+)?\s*$", re.IGNORECASE),
+    re.compile(r"\blimit\s+\d+\s*,\s*(?P<count>\d+)\s*$", re.IGNORECASE),  # MySQL LIMIT offset, count
+    re.compile(r"\bfetch\s+(?:first|next)\s+(?:(?P<count>\d+)\s+)?rows?\s+only\s*$", re.IGNORECASE),
+)
+_TRAILING_FETCH_WITH_TIES = re.compile(r"\bfetch\s+(?:first|next)\b.*\bwith\s+ties\s*$", re.IGNORECASE)
+_TRAILING_OFFSET = re.compile(r"\boffset\s+\d+(?:\s+rows?)?\s*$", re.IGNORECASE)
+
+
+def default_serializer(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime, dt_time)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    return json.dumps(value, default=default_serializer, separators=(",", ":"))
+
+
+def fetch_limits():
+    return (
+        int(os.getenv("SQL_MAX_ROWS", 1000)),
+        int(os.getenv("SQL_MAX_BYTES", 1024 * 1024)),
+        int(os.getenv("SQL_FETCH_BATCH_SIZE", 200)),
+    )
+
+
+def inject_limit(sql_query, max_rows):
+    """Bound the rows sql_query can return to max_rows + 1.
+
+    A trailing LIMIT n [OFFSET m], LIMIT m, n or FETCH FIRST n ROWS ONLY
+    keeps its form with n clamped to max_rows + 1; a trailing OFFSET gets a
+    LIMIT in front of it; FETCH ... WITH TIES is left as it is. Any other
+    query gets LIMIT max_rows + 1 appended. The extra row lets the fetcher
+    tell a complete result from a truncated one.
+    """
+    sql_query = sql_query.strip().rstrip(";").rstrip()
+    cap = max_rows + 1
+    for pattern in _TRAILING_LIMITS:
+        match = pattern.search(sql_query)
+        if match:
+            count = match.group("count")
+            if count is None or (count.isdigit() and int(count) <= cap):
+                return sql_query
+            return f"{sql_query[:match.start('count')]}{cap}{sql_query[match.end('count'):]}"
+    if _TRAILING_FETCH_WITH_TIES.search(sql_query):
+        return sql_query
+    match = _TRAILING_OFFSET.search(sql_query)
+    if match:
+        return f"{sql_query[:match.start()]}LIMIT {cap} {match.group(0)}"
+    return f"{sql_query}\nLIMIT {cap}"
+
+
+def empty_result():
+    return {"columns": [], "rows": [], "row_count": 0, "truncated": False}
+
+
+class BoundedRows:
+    """Accumulates streamed row batches up to max_rows rows or max_bytes of JSON."""
+
+    def __init__(self, max_rows, max_bytes):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.result = empty_result()
+        self.size = 0
+
+    def add(self, batch):
+        """Keep rows from batch; returns False once a limit has been hit."""
+        rows = self.result["rows"]
+        for row in batch:
+            row = list(row)
+            row_size = len(_dumps(row))
+            if len(rows) >= self.max_rows or self.size + row_size > self.max_bytes:
+                self.result["truncated"] = True
+                return False
+            rows.append(row)
+            self.size += row_size
+        return True
+
+    def finish(self, columns=None):
+        if columns is not None:
+            self.result["columns"] = list(columns)
+        self.result["row_count"] = len(self.result["rows"])
+        return self.result
+
+
+def fetch_bounded(cursor, max_rows, max_bytes, batch_size):
+    """Stream rows with fetchmany, stopping at max_rows rows or max_bytes of JSON.
+
+    Only the kept rows are held in memory. Rows left unread on an unbuffered
+    cursor are not drained: callers drop the connection of a truncated
+    result, which stops the server sending them.
+    """
+    rows = BoundedRows(max_rows, max_bytes)
+    columns = None
+
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if columns is None and cursor.description:
+            # Named (server-side) cursors only expose a description after the first fetch.
+            columns = [column[0] for column in cursor.description]
+        if not batch or not rows.add(batch):
+            break
+
+    return rows.finish(columns)
+
+
+async def afetch_bounded_mysql(cursor, max_rows, max_bytes, batch_size):
+    """Async counterpart of fetch_bounded for an aiomysql SSCursor; unread
+    rows are not drained either."""
+    rows = BoundedRows(max_rows, max_bytes)
+    columns = [column[0] for column in cursor.description] if cursor.description else []
+
+    while True:
+        batch = await cursor.fetchmany(batch_size)
+        if not batch or not rows.add(batch):
+            break
+
+    return rows.finish(columns)
+
+
+async def afetch_bounded_postgres(conn, sql_query, max_rows, max_bytes, batch_size, timeout_ms=0):
+    """Async counterpart of fetch_bounded using an asyncpg server-side cursor;
+    timeout_ms sets the statement timeout for the cursor's transaction."""
+    rows = BoundedRows(max_rows, max_bytes)
+    statement = await conn.prepare(sql_query)
+    columns = [attribute.name for attribute in statement.get_attributes()]
+
+    async with conn.transaction():
+        if timeout_ms:
+            await conn.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        cursor = await statement.cursor()
+        while True:
+            batch = await cursor.fetch(batch_size)
+            if not batch or not rows.add([tuple(record) for record in batch]):
+                break
+
+    return rows.finish(columns)
+
+
+def to_columnar_json(result):
+    """Compact serialization for prompts: column names once, then row arrays."""
+    if not isinstance(result, dict):
+        return _dumps(result)
+    payload = {"columns": result["columns"], "rows": result["rows"]}
+    if result.get("truncated"):
+        payload["truncated"] = True
+    return _dumps(payload)
@@ -1,59 +1,113 @@
-import mysql.connector
-from mysql.connector import Error as MySQLError
-
-def get_mysql_schema(mysql_db_config):
-    schema_info = ""
-    table_names = set()
-    column_names = set()
-    
-    try:
-        # Establish connection
-        with mysql.connector.connect(**mysql_db_config) as conn:
-            with conn.cursor(dictionary=True) as cursor:
-                # Get table names
-                cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-
-                for table in tables:
-                    table_name = list(table.values())[0]
-                    table_names.add(table_name.lower())
-                    schema_info += f"Table: {table_name}\n"
-                    
-                    # Get columns
-                    cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-                    columns = cursor.fetchall()
-                    for column in columns:
-                        column_name = column['Field'].lower()
-                        column_names.add(column_name)
-                        schema_info += f" - {column_name} ({column['Type']})\n"
-                    
-                    # Get primary keys
-                    cursor.execute(f"""
-                        SELECT COLUMN_NAME
-                        FROM information_schema.KEY_COLUMN_USAGE
-                        WHERE TABLE_NAME = '{table_name}' AND CONSTRAINT_NAME = 'PRIMARY'
-                    """)
-                    primary_keys = cursor.fetchall()
-                    if primary_keys:
-                        schema_info += " - Primary Key:\n"
-                        for pk in primary_keys:
-                            schema_info += f"   - {pk['COLUMN_NAME'].lower()}\n"
-
-                    # Get foreign keys
-                    cursor.execute(f"""
-                        SELECT COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
-                        FROM information_schema.KEY_COLUMN_USAGE
-                        WHERE TABLE_NAME = '{table_name}' AND REFERENCED_TABLE_NAME IS NOT NULL
-                    """)
-                    foreign_keys = cursor.fetchall()
-                    if foreign_keys:
-                        schema_info += " - Foreign Keys:\n"
-                        for fk in foreign_keys:
-                            schema_info += f"   - {fk['COLUMN_NAME'].lower()} -> {fk['REFERENCED_TABLE_NAME'].lower()}.{fk['REFERENCED_COLUMN_NAME'].lower()}\n"
-
-                    schema_info += "\n"
-
-    except MySQLError as err:
-        print(f"Error: {err}")
-
-    return schema_info, table_names, column_names
\ No newline at end of file
+from mysql.connector import Error as MySQLError
+from schema_cache import schema_cache, cache_key
+from db_pool import get_mysql_pool
+
+COLUMNS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+KEYS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE()
+      AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE))), 0))
+         FROM information_schema.COLUMNS
+         WHERE TABLE_SCHEMA = DATABASE()) AS columns_fingerprint,
+        (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0))
+         FROM information_schema.KEY_COLUMN_USAGE
+         WHERE TABLE_SCHEMA = DATABASE()) AS keys_fingerprint
+"""
+
+
+def load_mysql_schema(cursor):
+    tables = {}
+    cursor.execute(COLUMNS_QUERY)
+    for row in cursor.fetchall():
+        table = tables.setdefault(row['TABLE_NAME'], {"columns": [], "primary_key": [], "foreign_keys": []})
+        table["columns"].append((row['COLUMN_NAME'].lower(), row['COLUMN_TYPE']))
+
+    cursor.execute(KEYS_QUERY)
+    for row in cursor.fetchall():
+        table = tables.get(row['TABLE_NAME'])
+        if table is None:
+            continue
+        if row['CONSTRAINT_NAME'] == 'PRIMARY':
+            table["primary_key"].append(row['COLUMN_NAME'].lower())
+        else:
+            table["foreign_keys"].append((
+                row['COLUMN_NAME'].lower(),
+                row['REFERENCED_TABLE_NAME'].lower(),
+                row['REFERENCED_COLUMN_NAME'].lower()
+            ))
+    return tables
+
+
+def render_mysql_schema(tables):
+    schema_info = ""
+    for table_name, table in tables.items():
+        schema_info += f"Table: {table_name}\n"
+        for column_name, column_type in table["columns"]:
+            schema_info += f" - {column_name} ({column_type})\n"
+        if table["primary_key"]:
+            schema_info += " - Primary Key:\n"
+            for pk in table["primary_key"]:
+                schema_info += f"   - {pk}\n"
+        if table["foreign_keys"]:
+            schema_info += " - Foreign Keys:\n"
+            for column_name, ref_table, ref_column in table["foreign_keys"]:
+                schema_info += f"   - {column_name} -> {ref_table}.{ref_column}\n"
+        schema_info += "\n"
+    return schema_info
+
+
+def get_mysql_schema_entry(mysql_db_config):
+    def query(fn):
+        with get_mysql_pool(mysql_db_config).connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                return fn(cursor)
+
+    def load():
+        tables = query(load_mysql_schema)
+        return {
+            "tables": tables,
+            "schema_info": render_mysql_schema(tables),
+            "table_names": {name.lower() for name in tables},
+            "column_names": {column for table in tables.values() for column, _ in table["columns"]},
+        }
+
+    def fingerprint():
+        def fetch(cursor):
+            cursor.execute(FINGERPRINT_QUERY)
+            row = cursor.fetchone()
+            return f"{row['columns_fingerprint']}/{row['keys_fingerprint']}"
+        return query(fetch)
+
+    return schema_cache.get(cache_key("mysql", mysql_db_config), load, fingerprint)
+
+
+def peek_mysql_schema(mysql_db_config):
+    return schema_cache.peek(cache_key("mysql", mysql_db_config))
+
+
+def get_mysql_schema_fingerprint(mysql_db_config):
+    entry = peek_mysql_schema(mysql_db_config)
+    return entry["fingerprint"] if entry else None
+
+
+def get_mysql_schema(mysql_db_config):
+    try:
+        entry = get_mysql_schema_entry(mysql_db_config)
+    except MySQLError as err:
+        print(f"Error: {err}")
+        return "", set(), set()
+
+    return entry["schema_info"], entry["table_names"], entry["column_names"]
@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache:
+    """TTL cache for rendered database schemas with cheap change detection.
+
+    Entries are served straight from memory for ttl seconds. After that a
+    single fingerprint query decides whether the cached schema is still valid;
+    the full introspection only runs again when the fingerprint changes.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("SCHEMA_CACHE_TTL", 300))
+        self.entries = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get(self, key, load, fingerprint):
+        """Return the cached entry for key.
+
+        load() returns a new entry dict and fingerprint() returns a string that
+        changes whenever the schema does.
+        """
+        entry = self.entries.get(key)
+        if entry and time.monotonic() - entry["checked_at"] < self.ttl:
+            return entry
+
+        # One thread per key refreshes; the others wait and reuse its result.
+        with self._key_lock(key):
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry["checked_at"] < self.ttl:
+                return entry
+
+            current = fingerprint()
+            if entry and entry["fingerprint"] == current:
+                entry["checked_at"] = time.monotonic()
+                return entry
+
+            entry = load()
+            entry.update({"fingerprint": current, "checked_at": time.monotonic()})
+            self.entries[key] = entry
+            logger.info(f"Schema cache refreshed for {key[0]}: {len(entry['tables'])} tables")
+            return entry
+
+    def peek(self, key):
+        return self.entries.get(key)
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+schema_cache = SchemaCache()
+
+
+def cache_key(backend, db_config):
+    return (backend, db_config.get("host"), db_config.get("database"), db_config.get("user"))
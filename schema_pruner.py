@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+
+import numpy as np
+
+from hybrid_retriever import tokenize
+from metrics import estimate_tokens
+from query_router import STOPWORDS, singular
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaPruner:
+    """Selects the tables relevant to a question before SQL generation.
+
+    Tables are scored by lexical overlap between the question and the table
+    and column names, plus cosine similarity between the question and an
+    embedding of each table's rendered description. The top_n tables and their
+    foreign-key neighbours are rendered, best first, until token_budget is
+    reached. Schemas with at most top_n tables are passed through unchanged.
+    """
+
+    def __init__(self, embeddings, render, top_n=None, token_budget=None):
+        self.embeddings = embeddings
+        self.render = render
+        self.top_n = top_n or int(os.getenv("SCHEMA_PRUNE_TOP_N", 5))
+        self.token_budget = token_budget or int(os.getenv("SCHEMA_TOKEN_BUDGET", 1500))
+        self.table_vectors = {}  # fingerprint -> (table names, normalized matrix)
+        self.lock = threading.Lock()
+        self.metrics = {"requests": 0, "pruned": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def _table_matrix(self, fingerprint, tables):
+        cached = self.table_vectors.get(fingerprint)
+        if cached is None:
+            names = list(tables)
+            descriptions = [self.render({name: tables[name]}) for name in names]
+            # Embedded while a request waits, under the bounded request-path policy
+            matrix = np.asarray(self.embeddings.embed_documents(descriptions, interactive=True), dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            cached = (names, matrix)
+            with self.lock:
+                # Only the current schema version is worth keeping.
+                self.table_vectors = {fingerprint: cached}
+        return cached
+
+    @staticmethod
+    def _lexical_score(tokens, name, table):
+        terms = {singular(name.lower())} | {singular(part) for part in name.lower().split("_")}
+        columns = set()
+        for column, _ in table["columns"]:
+            columns.add(singular(column.lower()))
+            columns.update(singular(part) for part in column.lower().split("_") if len(part) > 2)
+        return sum(1.0 if token in terms else 0.5 if token in columns else 0.0 for token in tokens)
+
+    def _neighbours(self, selected, tables):
+        by_lower = {name.lower(): name for name in tables}
+        neighbours = []
+        for name in selected:
+            for _, ref_table, _ in tables[name]["foreign_keys"]:
+                ref = by_lower.get(ref_table.lower())
+                if ref and ref not in selected and ref not in neighbours:
+                    neighbours.append(ref)
+        selected_lower = {name.lower() for name in selected}
+        for name, table in tables.items():
+            if name in selected or name in neighbours:
+                continue
+            if any(ref_table.lower() in selected_lower for _, ref_table, _ in table["foreign_keys"]):
+                neighbours.append(name)
+        return neighbours
+
+    def prune(self, user_query, schema_entry):
+        """Return (schema_info, stats) for the tables relevant to user_query."""
+        full_schema = schema_entry["schema_info"]
+        tables = schema_entry["tables"]
+        tokens_before = estimate_tokens(full_schema)
+
+        names = list(tables)
+        semantic = None
+        if len(tables) > self.top_n:
+            try:
+                names, matrix = self._table_matrix(schema_entry["fingerprint"], tables)
+                query_vector = np.asarray(self.embeddings.embed_query(user_query), dtype=np.float32)
+                query_vector /= max(np.linalg.norm(query_vector), 1e-12)
+                semantic = matrix @ query_vector
+            except Exception as e:
+                # The embedding API being down must not take the SQL path with it.
+                logger.warning(f"Schema pruning without embeddings, ranking tables lexically: {e}")
+
+        tokens = [singular(token) for token in tokenize(user_query) if token not in STOPWORDS]
+        lexical = np.array([self._lexical_score(tokens, name, tables[name]) for name in names])
+
+        if len(tables) <= self.top_n or (semantic is None and not lexical.max() > 0):
+            # Nothing to prune, or nothing to rank the tables by: send them all.
+            schema_info, tables_after = full_schema, len(tables)
+        else:
+            if lexical.max() > 0:
+                lexical = lexical / lexical.max()
+
+            scores = 0.6 * lexical + (0.4 * semantic if semantic is not None else 0.0)
+            # Without the semantic score, tables no query term matches are not candidates
+            ranked = [names[i] for i in np.argsort(-scores) if semantic is not None or lexical[i] > 0]
+            selected = ranked[:self.top_n]
+            candidates = selected + self._neighbours(selected, tables)
+
+            chosen, used = {}, 0
+            for name in candidates:
+                block = self.render({name: tables[name]})
+                cost = estimate_tokens(block)
+                if chosen and used + cost > self.token_budget:
+                    continue
+                chosen[name] = tables[name]
+                used += cost
+            schema_info, tables_after = self.render(chosen), len(chosen)
+
+        stats = {
+            "tables_before": len(tables),
+            "tables_after": tables_after,
+            "tokens_before": tokens_before,
+            "tokens_after": estimate_tokens(schema_info),
+        }
+        with self.lock:
+            self.metrics["requests"] += 1
+            self.metrics["pruned"] += int(schema_info is not full_schema)
+            self.metrics["tokens_before"] += stats["tokens_before"]
+            self.metrics["tokens_after"] += stats["tokens_after"]
+        logger.info(f"Schema prompt: {stats['tables_after']}/{stats['tables_before']} tables, "
+                    f"{stats['tokens_after']}/{stats['tokens_before']} tokens")
+        return schema_info, stats
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        requests = metrics["requests"] or 1
+        metrics["avg_tokens_before"] = round(metrics["tokens_before"] / requests, 1)
+        metrics["avg_tokens_after"] = round(metrics["tokens_after"] / requests, 1)
+        return metrics
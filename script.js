@@ -1,32 +1,89 @@
-document.getElementById('queryForm').addEventListener('submit', async function(e) {
-    e.preventDefault();
-
-    const prompt = document.getElementById('prompt').value;
-    const resultDiv = document.getElementById('result');
-    const startTime = performance.now();
-
-    try {
-        const response = await fetch('http://127.0.0.1:8008/query', {  // Changed port to 8008
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ prompt: prompt }),
-        });
-
-        const data = await response.json();
-        const endTime = performance.now();
-        const responseTime = endTime - startTime;
-
-        if (response.ok) {
-            resultDiv.innerHTML = `
-                <p><strong>Result:</strong> ${data.result}</p>
-                <p><strong>Response Time:</strong> ${responseTime.toFixed(2)} ms</p>
-            `;
-        } else {
-            resultDiv.innerHTML = `<p style="color: red;"><strong>Error:</strong> ${data.error}</p>`;
-        }
-    } catch (error) {
-        resultDiv.innerHTML = `<p style="color: red;"><strong>Error:</strong> ${error.message}</p>`;
-    }
-});
+function parseSseEvent(block) {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    }
+    return { event: event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+function formatTimings(timings) {
+    return Object.entries(timings)
+        .map(([stage, ms]) => `${stage}: ${ms.toFixed(0)} ms`)
+        .join(', ');
+}
+
+document.getElementById('queryForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const prompt = document.getElementById('prompt').value;
+    const resultDiv = document.getElementById('result');
+    const startTime = performance.now();
+
+    resultDiv.innerHTML = `
+        <p><strong>Progress:</strong> <span id="progress">routing...</span></p>
+        <p><strong>Result:</strong> <span id="summary"></span></p>
+        <p id="timing"></p>
+    `;
+    const progressSpan = document.getElementById('progress');
+    const summarySpan = document.getElementById('summary');
+    const timingP = document.getElementById('timing');
+    const finished = [];
+
+    try {
+        const response = await fetch('http://127.0.0.1:8008/query/stream', {  // Changed port to 8008
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ prompt: prompt }),
+        });
+
+        if (!response.ok) {
+            const data = await response.json();
+            resultDiv.innerHTML = `<p style="color: red;"><strong>Error:</strong> ${data.error}</p>`;
+            return;
+        }
+
+        // Render events as they arrive: source progress first, then summary tokens.
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const { event, data } = parseSseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event === 'progress') {
+                    const note = data.status && data.status !== 'ok' ? `, ${data.status.replace('_', ' ')}` : '';
+                    finished.push(`${data.source} (${data.elapsed_ms.toFixed(0)} ms${note})`);
+                    progressSpan.textContent = finished.join(', ');
+                } else if (event === 'token') {
+                    summarySpan.textContent += data.text;
+                } else if (event === 'done') {
+                    const responseTime = performance.now() - startTime;
+                    timingP.innerHTML = `
+                        <strong>Response Time:</strong> ${responseTime.toFixed(2)} ms
+                        (${data.answer_cache === 'hit' ? 'cached answer' : formatTimings(data.timings_ms)})
+                    `;
+                } else if (event === 'error') {
+                    resultDiv.innerHTML = `<p style="color: red;"><strong>Error:</strong> ${data.error}</p>`;
+                }
+            }
+        }
+    } catch (error) {
+        resultDiv.innerHTML = `<p style="color: red;"><strong>Error:</strong> ${error.message}</p>`;
+    }
+});
@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from hybrid_retriever import tokenize
+from query_router import STOPWORDS, singular
+
+logger = logging.getLogger(__name__)
+
+_LITERAL_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"|\d+(?:\.\d+)?")
+
+
+def normalize_question(question):
+    question = question.strip().lower()
+    question = re.sub(r"\s+", " ", question)
+    return question.rstrip(" ?.!;")
+
+
+def question_literals(question):
+    # Numbers and quoted values change the meaning of a question even when the
+    # wording is nearly identical ("sales in 2023" vs "sales in 2024").
+    return frozenset(_LITERAL_PATTERN.findall(question))
+
+
+def question_terms(question):
+    """Content words in order (singularized non-stopword tokens) plus literals.
+
+    Unquoted values matter as much as literals ("sales in Europe" vs "sales
+    in Asia", months, customer names), and so does the order of the content
+    words ("customers with most orders" vs "orders with most customers"); only
+    stopwords, plurals, case and punctuation may differ between two
+    questions that share SQL.
+    """
+    words = tuple(singular(token) for token in tokenize(question) if token not in STOPWORDS)
+    return words, question_literals(question)
+
+
+class SQLCache:
+    """Question -> generated SQL cache scoped to a schema fingerprint.
+
+    Lookups first try an exact match on the normalized question, then a
+    cached question under the same fingerprint with the same question_terms.
+    Neither needs an embedding, so a lookup never waits on the embedding API.
+    Entries are evicted least-recently-used beyond max_entries or after ttl.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1000))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SQL_CACHE_TTL", 24 * 3600))
+        self.entries = OrderedDict()  # (fingerprint, normalized question) -> entry
+        self.by_terms = {}  # (fingerprint, question terms) -> key of the latest entry with them
+        self.lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "term_hits": 0, "misses": 0, "evictions": 0}
+
+    def _expired(self, entry):
+        return time.monotonic() - entry["created_at"] > self.ttl
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry and self.by_terms.get((key[0], entry["terms"])) == key:
+            del self.by_terms[(key[0], entry["terms"])]
+
+    def _live(self, key):
+        entry = self.entries.get(key)
+        if entry and self._expired(entry):
+            self._drop(key)
+            return None
+        return entry
+
+    def lookup(self, fingerprint, question):
+        """Return the cached SQL for question, or None on a miss."""
+        if fingerprint is None:
+            return None
+        key = (fingerprint, normalize_question(question))
+        terms = question_terms(key[1])
+
+        with self.lock:
+            entry = self._live(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                return entry["sql"]
+
+            # A question made only of stopwords and literals says too little to share SQL
+            match = self.by_terms.get((fingerprint, terms)) if terms[0] else None
+            entry = self._live(match) if match else None
+            if entry:
+                self.entries.move_to_end(match)
+                self.counters["term_hits"] += 1
+                logger.info(f"SQL cache: hit for '{key[1]}' -> '{match[1]}'")
+                return entry["sql"]
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, fingerprint, question, sql):
+        if fingerprint is None:
+            return
+        key = (fingerprint, normalize_question(question))
+        with self.lock:
+            self._drop(key)
+            terms = question_terms(key[1])
+            self.entries[key] = {"sql": sql, "terms": terms, "created_at": time.monotonic()}
+            self.by_terms[(fingerprint, terms)] = key
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._drop(oldest)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, fingerprint=None):
+        with self.lock:
+            if fingerprint is None:
+                self.entries.clear()
+                self.by_terms.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == fingerprint]:
+                    self._drop(key)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+        lookups = stats["exact_hits"] + stats["term_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["exact_hits"] + stats["term_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+_SELECT_PATTERN = re.compile(r"^\s*select\b", re.IGNORECASE)
+
+# MySQL ER_QUERY_TIMEOUT: "maximum statement execution time exceeded"
+MYSQL_QUERY_TIMEOUT = 3024
+
+
+class QueryCostExceeded(Exception):
+    """The planner's estimated cost for a generated query is above the backend's limit."""
+
+    def __init__(self, source, cost, limit):
+        super().__init__(f"{source} query estimated cost {cost:.0f} exceeds the limit of {limit:.0f}")
+        self.source = source
+        self.cost = cost
+        self.limit = limit
+
+
+class StatementTimeout(Exception):
+    """The database cancelled a query that ran past its statement timeout."""
+
+
+def guard_limits(source):
+    """Return (statement timeout in ms, max estimated cost) for source; 0 disables either."""
+    return (
+        int(os.getenv(f"{source.upper()}_STATEMENT_TIMEOUT_MS", os.getenv("SQL_STATEMENT_TIMEOUT_MS", 8000))),
+        float(os.getenv(f"{source.upper()}_MAX_QUERY_COST", 1e6)),
+    )
+
+
+def rewrite_enabled():
+    return os.getenv("SQL_COST_REWRITE", "true").lower() in ("1", "true", "yes")
+
+
+def mysql_timeout_hint(sql_query, timeout_ms):
+    """Add a MAX_EXECUTION_TIME optimizer hint, so MySQL itself aborts the
+    SELECT after timeout_ms; unlike a session variable it cannot leak to the
+    next user of a pooled connection."""
+    if not timeout_ms or "MAX_EXECUTION_TIME" in sql_query.upper():
+        return sql_query
+    return _SELECT_PATTERN.sub(f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */", sql_query, count=1)
+
+
+def mysql_plan_cost(explain_output):
+    """query_cost from EXPLAIN FORMAT=JSON (a JSON string)."""
+    plan = json.loads(explain_output) if isinstance(explain_output, (str, bytes)) else explain_output
+    return float(plan["query_block"]["cost_info"]["query_cost"])
+
+
+def postgres_plan_cost(explain_output):
+    """Total Cost of the top plan node from EXPLAIN (FORMAT JSON); psycopg2
+    already decodes the json column, asyncpg returns it as text."""
+    plan = json.loads(explain_output) if isinstance(explain_output, (str, bytes)) else explain_output
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def rewrite_request(user_query, sql_query, cost):
+    """Natural language request asking the SQL prompt for a cheaper query."""
+    return (f"{user_query}\n\nThis query was estimated too expensive to run (planner cost {cost:.0f}):\n"
+            f"{sql_query}\nWrite a cheaper query for the same request: filter on key or indexed columns, "
+            "avoid full scans and cross joins, and aggregate rather than list rows where possible.")
+
+
+def _over_limit(source, sql_query, cost, max_cost):
+    if cost is None or cost <= max_cost:
+        return False
+    logger.warning(f"{source} query estimated cost {cost:.0f} is over the limit of {max_cost:.0f}: {sql_query}")
+    return True
+
+
+def guard_query(source, sql_query, estimate, rewrite, max_cost):
+    """Return sql_query, or a cheaper rewrite of it, once its estimated cost is within max_cost.
+
+    estimate(sql) returns the planner's cost, or None when the plan cannot be
+    read; such queries run unchecked (the statement timeout still applies).
+    rewrite(sql, cost) asks for a cheaper query once; if that is still too
+    expensive, or rewriting is off, QueryCostExceeded is raised.
+    """
+    if not max_cost:
+        return sql_query
+    cost = estimate(sql_query)
+    if not _over_limit(source, sql_query, cost, max_cost):
+        return sql_query
+    if rewrite is not None and rewrite_enabled():
+        try:
+            rewritten = rewrite(sql_query, cost)
+        except Exception as e:
+            logger.warning(f"Could not rewrite expensive {source} query: {e}")
+        else:
+            rewritten_cost = estimate(rewritten)
+            if not _over_limit(source, rewritten, rewritten_cost, max_cost):
+                logger.info(f"Rewrote expensive {source} query (estimated cost was {cost:.0f}): {rewritten}")
+                return rewritten
+            cost = rewritten_cost
+    raise QueryCostExceeded(source, cost, max_cost)
+
+
+async def aguard_query(source, sql_query, estimate, rewrite, max_cost):
+    """Async counterpart of guard_query; estimate and rewrite are coroutine functions."""
+    if not max_cost:
+        return sql_query
+    cost = await estimate(sql_query)
+    if not _over_limit(source, sql_query, cost, max_cost):
+        return sql_query
+    if rewrite is not None and rewrite_enabled():
+        try:
+            rewritten = await rewrite(sql_query, cost)
+        except Exception as e:
+            logger.warning(f"Could not rewrite expensive {source} query: {e}")
+        else:
+            rewritten_cost = await estimate(rewritten)
+            if not _over_limit(source, rewritten, rewritten_cost, max_cost):
+                logger.info(f"Rewrote expensive {source} query (estimated cost was {cost:.0f}): {rewritten}")
+                return rewritten
+            cost = rewritten_cost
+    raise QueryCostExceeded(source, cost, max_cost)
@@ -0,0 +1,234 @@
+import os
+import asyncio
+import logging
+
+from langchain.prompts import PromptTemplate
+from langchain.chains import LLMChain
+
+from clients import get_sql_llm
+from embedding_service import get_embedding_service
+from sql_cache import SQLCache
+from schema_pruner import SchemaPruner
+from result_fetch import fetch_limits, inject_limit
+from metrics import record_rows, record_tokens, timed
+from sql_guard import aguard_query, guard_limits, guard_query, rewrite_request
+
+logger = logging.getLogger(__name__)
+
+
+class SQLSource:
+    """Answers a question from one SQL backend: cached or generated SQL, a cost
+    check, then a bounded, time-limited execution.
+
+    Subclasses set source ("mysql", "postgresql"; also the metrics stage
+    prefix), pass their connection config and schema functions, and
+    implement the backend hooks:
+    - execute_sql_query / aexecute_sql_query: run the query within
+      statement_timeout_ms, raising StatementTimeout when the server cancels
+      it and re-raising any other database error
+    - plan_cost / aplan_cost: the planner's cost for a query from EXPLAIN
+    """
+
+    source = None
+
+    def __init__(self, db_config, get_schema, get_fingerprint, peek_schema, render_schema):
+        # OpenAI API Key
+        self.api_key = os.getenv("OPENAI_API_KEY")
+
+        self.db_config = db_config
+        self.get_schema = get_schema
+        self.get_fingerprint = get_fingerprint
+        self.peek_schema = peek_schema
+
+        # LLM client for SQL generation, one per source and process, with a
+        # timeout and retry count that fit this source's latency budget
+        self.llm = get_sql_llm(self.source)
+
+        # Define prompts
+        self.sql_prompt_template = """
+        You are a SQL expert. Given the schema of the database and a natural language request, generate an accurate SQL query. Please provide only the SQL query with no additional text or explanation.
+
+        Database Schema:
+        {schema_info}
+
+        Natural Language Request:
+        {user_query}
+
+        SQL Query:
+        """
+
+        # Initialize LLM Chains
+        self.llm_chain_sql = LLMChain(
+            prompt=PromptTemplate(input_variables=["schema_info", "user_query"], template=self.sql_prompt_template),
+            llm=self.llm
+        )
+
+        # Shared, cached embedding service
+        self.embeddings = get_embedding_service()
+
+        # Question -> SQL cache scoped to the schema fingerprint
+        self.sql_cache = SQLCache()
+
+        # Sends only the tables relevant to the question to the SQL prompt
+        self.schema_pruner = SchemaPruner(self.embeddings, render_schema)
+
+    @property
+    def statement_timeout_ms(self):
+        return guard_limits(self.source)[0]
+
+    @property
+    def max_query_cost(self):
+        return guard_limits(self.source)[1]
+
+    def clean_sql_query(self, prompt_result):
+        sql_query = prompt_result.strip()
+        logger.info(f"Generated SQL Query: {sql_query}")
+
+        if not sql_query.lower().startswith("select"):
+            raise ValueError("The generated SQL query is not a SELECT query.")
+        return sql_query
+
+    # Backend hooks
+
+    def execute_sql_query(self, sql_query):
+        raise NotImplementedError
+
+    async def aexecute_sql_query(self, sql_query):
+        raise NotImplementedError
+
+    def plan_cost(self, sql_query):
+        raise NotImplementedError
+
+    async def aplan_cost(self, sql_query):
+        raise NotImplementedError
+
+    # Shared pipeline
+
+    def estimate_cost(self, sql_query):
+        """Planner cost of sql_query as it will run (with the row limit), or None if it cannot be read."""
+        max_rows, _, _ = fetch_limits()
+        try:
+            return self.plan_cost(inject_limit(sql_query, max_rows))
+        except Exception as err:
+            logger.warning(f"Could not estimate the {self.source} query cost, running it unchecked: {err}")
+            return None
+
+    async def aestimate_cost(self, sql_query):
+        max_rows, _, _ = fetch_limits()
+        try:
+            return await self.aplan_cost(inject_limit(sql_query, max_rows))
+        except Exception as err:
+            logger.warning(f"Could not estimate the {self.source} query cost, running it unchecked: {err}")
+            return None
+
+    def rewrite_sql_query(self, user_query, schema_info, sql_query, cost):
+        # Asks the SQL prompt once more, for a cheaper query answering the same request
+        request = rewrite_request(user_query, sql_query, cost)
+        with timed(f"{self.source}.sql_rewrite"):
+            prompt_result = self.llm_chain_sql.run({"schema_info": schema_info, "user_query": request})
+        record_tokens(f"{self.source}.sql_rewrite", self.sql_prompt_template + schema_info + request, prompt_result)
+        return self.clean_sql_query(prompt_result)
+
+    async def arewrite_sql_query(self, user_query, schema_info, sql_query, cost):
+        request = rewrite_request(user_query, sql_query, cost)
+        with timed(f"{self.source}.sql_rewrite"):
+            prompt_result = await self.llm_chain_sql.arun({"schema_info": schema_info, "user_query": request})
+        record_tokens(f"{self.source}.sql_rewrite", self.sql_prompt_template + schema_info + request, prompt_result)
+        return self.clean_sql_query(prompt_result)
+
+    def relevant_schema(self, user_query, schema_info):
+        entry = self.peek_schema(self.db_config)
+        if not entry:
+            return schema_info
+        pruned_schema, _ = self.schema_pruner.prune(user_query, entry)
+        return pruned_schema
+
+    def _finish(self, fingerprint, user_query, sql_query, cached_sql, results):
+        # Execution errors raise, so only SQL that ran is cached
+        record_rows(self.source, results)
+        if not cached_sql:
+            self.sql_cache.store(fingerprint, user_query, sql_query)
+        return results
+
+    def generate_and_execute_sql_query(self, user_query):
+        source = self.source
+        try:
+            with timed(f"{source}.schema"):
+                schema_info, _, _ = self.get_schema(self.db_config)
+                fingerprint = self.get_fingerprint(self.db_config)
+
+            # Reuse SQL generated earlier for the same or a near-identical question
+            with timed(f"{source}.sql_cache"):
+                cached_sql = self.sql_cache.lookup(fingerprint, user_query)
+            if cached_sql:
+                sql_query = cached_sql
+                logger.info(f"Cached SQL Query: {sql_query}")
+            else:
+                with timed(f"{source}.schema_pruning"):
+                    pruned_schema = self.relevant_schema(user_query, schema_info)
+                # Generate SQL query
+                with timed(f"{source}.sql_generation"):
+                    prompt_result = self.llm_chain_sql.run({
+                        "schema_info": pruned_schema,
+                        "user_query": user_query
+                    })
+                record_tokens(f"{source}.sql_generation", self.sql_prompt_template + pruned_schema + user_query,
+                              prompt_result)
+                sql_query = self.clean_sql_query(prompt_result)
+
+                # Queries the planner expects to be too expensive are rewritten
+                # or refused; cached SQL passed this check when it was stored.
+                with timed(f"{source}.cost_guard"):
+                    sql_query = guard_query(
+                        source, sql_query, self.estimate_cost,
+                        lambda sql, cost: self.rewrite_sql_query(user_query, pruned_schema, sql, cost),
+                        self.max_query_cost
+                    )
+
+            # Execute SQL query
+            with timed(f"{source}.sql_execution"):
+                results = self.execute_sql_query(sql_query)
+            return self._finish(fingerprint, user_query, sql_query, cached_sql, results)
+        except Exception as e:
+            logger.error(f"Error generating or executing SQL query: {e}")
+            raise
+
+    async def agenerate_and_execute_sql_query(self, user_query):
+        source = self.source
+        try:
+            # The schema lookup is usually an in-memory hit; the rare refresh
+            # runs off the event loop. The SQL cache lookup is in memory.
+            with timed(f"{source}.schema"):
+                schema_info, _, _ = await asyncio.to_thread(self.get_schema, self.db_config)
+                fingerprint = self.get_fingerprint(self.db_config)
+
+            with timed(f"{source}.sql_cache"):
+                cached_sql = self.sql_cache.lookup(fingerprint, user_query)
+            if cached_sql:
+                sql_query = cached_sql
+                logger.info(f"Cached SQL Query: {sql_query}")
+            else:
+                with timed(f"{source}.schema_pruning"):
+                    pruned_schema = await asyncio.to_thread(self.relevant_schema, user_query, schema_info)
+                with timed(f"{source}.sql_generation"):
+                    prompt_result = await self.llm_chain_sql.arun({
+                        "schema_info": pruned_schema,
+                        "user_query": user_query
+                    })
+                record_tokens(f"{source}.sql_generation", self.sql_prompt_template + pruned_schema + user_query,
+                              prompt_result)
+                sql_query = self.clean_sql_query(prompt_result)
+
+                with timed(f"{source}.cost_guard"):
+                    sql_query = await aguard_query(
+                        source, sql_query, self.aestimate_cost,
+                        lambda sql, cost: self.arewrite_sql_query(user_query, pruned_schema, sql, cost),
+                        self.max_query_cost
+                    )
+
+            with timed(f"{source}.sql_execution"):
+                results = await self.aexecute_sql_query(sql_query)
+            return self._finish(fingerprint, user_query, sql_query, cached_sql, results)
+        except Exception as e:
+            logger.error(f"Error generating or executing SQL query: {e}")
+            raise
@@ -0,0 +1,67 @@
+import os
+import sys
+import logging
+import tempfile
+
+import pytest
+
+# The modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_cache import answer_cache
+
+logging.disable(logging.WARNING)
+
+
+@pytest.fixture(scope="session")
+def processor():
+    """The MainProcessor on the benchmark stand-ins: a fake LLM and embeddings,
+    SQLite behind both SQL backends and a small ingested corpus, all under a
+    temporary directory."""
+    from benchmarks.run import configure_environment
+
+    workdir = tempfile.mkdtemp(prefix="datamind-tests-")
+    corpus_dir = configure_environment({}, workdir)
+
+    from benchmarks.fakes import FakeChatModel, HashEmbeddings, build_sqlite_database, install_sql_backend
+    from benchmarks.corpus import generate_corpus
+    from clients import set_client
+    from embedding_service import EmbeddingService, set_embedding_service
+
+    # The stand-ins have to be registered before the processors are created.
+    set_embedding_service(EmbeddingService(embedder=HashEmbeddings(latency_ms=0), model="hash-256"))
+    llm = FakeChatModel(latency_ms=1)
+    for name in ("llm", "sql_llm.mysql", "sql_llm.postgresql"):
+        set_client(name, llm)
+
+    import MainProcessor as main_module
+    from schema import render_mysql_schema
+    from postgresql import render_postgres_schema
+    from schema_cache import schema_cache
+
+    processor = main_module.processor
+    schema_cache.ttl = float("inf")
+    for backend, db_config, render in (
+        ("mysql", processor.query_processor.mysql_db_config, render_mysql_schema),
+        ("postgresql", processor.postgresql_processor.postgresql_db_config, render_postgres_schema),
+    ):
+        path = os.path.join(workdir, f"{backend}.sqlite3")
+        build_sqlite_database(path, tables=8, rows=50, seed=0)
+        install_sql_backend(backend, db_config, path, render)
+    generate_corpus(corpus_dir, 4, seed=0)
+    processor.document_processor.ingest_documents(corpus_dir)
+    return processor
+
+
+@pytest.fixture
+def app(processor):
+    import MainProcessor as main_module
+    return main_module.app
+
+
+@pytest.fixture(autouse=True)
+def fresh_answers():
+    # Answers cached by one test must not turn the next one's miss into a hit
+    yield
+    answer_cache.invalidate()
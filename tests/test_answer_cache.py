@@ -0,0 +1,115 @@
+import time
+import asyncio
+import threading
+
+from answer_cache import AnswerCache
+
+VERSIONS = {"documents": "v1"}
+
+
+def run_concurrently(cache, compute, release, callers=4):
+    """Call get_or_compute from callers threads, setting release once all
+    but the first are waiting on its computation."""
+    outcomes = {}
+
+    def call(i):
+        try:
+            outcomes[i] = cache.get_or_compute("How many orders?", VERSIONS, compute)
+        except Exception as e:
+            outcomes[i] = e
+
+    leader = threading.Thread(target=call, args=(0,))
+    leader.start()
+    while not cache.in_flight:
+        time.sleep(0.001)
+    followers = [threading.Thread(target=call, args=(i,)) for i in range(1, callers)]
+    for thread in followers:
+        thread.start()
+    while cache.stats()["coalesced"] < callers - 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    return outcomes
+
+
+def test_identical_requests_share_one_computation():
+    cache, calls, release = AnswerCache(), [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return "42 orders"
+
+    outcomes = run_concurrently(cache, compute, release)
+    assert len(calls) == 1
+    assert sorted(status for _, status in outcomes.values()) == ["coalesced"] * 3 + ["miss"]
+    assert {answer for answer, _ in outcomes.values()} == {"42 orders"}
+    assert cache.get_or_compute("how many orders", VERSIONS, compute) == ("42 orders", "hit")
+
+
+def test_the_leaders_error_reaches_every_waiting_request():
+    cache, release = AnswerCache(), threading.Event()
+
+    def compute():
+        release.wait()
+        raise ValueError("summary failed")
+
+    outcomes = run_concurrently(cache, compute, release)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes.values())
+    assert cache.stats()["in_flight"] == 0
+    # Nothing was cached; the next request computes again
+    assert cache.get_or_compute("How many orders?", VERSIONS, lambda: "42 orders") == ("42 orders", "miss")
+
+
+def test_a_partial_answer_is_shared_but_not_cached():
+    cache = AnswerCache()
+    assert cache.get_or_compute("q", VERSIONS, lambda: "partial", cacheable=lambda _: False) == ("partial", "miss")
+    assert cache.lookup("q", VERSIONS) is None
+
+
+def test_claim_and_resolve():
+    cache = AnswerCache()
+    status, future = cache.claim("q", VERSIONS)
+    assert status == "miss"
+    follower_status, follower_future = cache.claim("q", VERSIONS)
+    assert (follower_status, follower_future) == ("coalesced", future)
+    cache.resolve("q", VERSIONS, future, "answer")
+    assert follower_future.result() == "answer"
+    assert cache.claim("q", VERSIONS) == ("hit", "answer")
+
+
+def test_an_answer_invalidated_while_computing_is_not_stored():
+    cache = AnswerCache()
+    status, future = cache.claim("q", VERSIONS)
+    cache.invalidate("q")
+    cache.resolve("q", VERSIONS, future, "stale")
+    assert future.result() == "stale"
+    assert cache.lookup("q", VERSIONS) is None
+
+
+def test_other_data_versions_miss():
+    cache = AnswerCache()
+    cache.store("q", VERSIONS, "answer")
+    assert cache.lookup("q", {"documents": "v2"}) is None
+
+
+def test_async_error_propagation():
+    cache = AnswerCache()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.01)
+            raise ValueError("summary failed")
+
+        leader = asyncio.ensure_future(cache.aget_or_compute("q", VERSIONS, compute))
+        await started.wait()
+        followers = [cache.aget_or_compute("q", VERSIONS, compute) for _ in range(3)]
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert cache.stats()["coalesced"] == 3
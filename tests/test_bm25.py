@@ -0,0 +1,53 @@
+import os
+
+from hybrid_retriever import BM25Index
+
+
+def ids(results):
+    return [doc.metadata["chunk_id"] for doc, _ in results]
+
+
+def test_add_and_search(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    index.add("a", "refund policy for damaged orders", {"filename": "policy.pdf"})
+    index.add("b", "warehouse shipment schedule", {"filename": "ops.pdf"})
+    assert ids(index.search("refund")) == ["a"]
+    assert ids(index.search("refund shipment", filter={"filename": "ops.pdf"})) == ["b"]
+
+
+def test_re_adding_a_chunk_replaces_it(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    index.add("a", "refund policy")
+    index.add("a", "shipment schedule")
+    assert len(index) == 1
+    assert index.search("refund") == []
+    assert index.total_length == 2
+
+
+def test_remove_drops_postings_and_lengths(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    index.add("a", "refund policy")
+    index.add("b", "refund schedule")
+    index.remove("a")
+    index.remove("missing")
+    assert "a" not in index
+    assert "policy" not in index.postings
+    assert index.postings["refund"] == {"b": 1}
+    assert index.total_length == 2
+    assert ids(index.search("refund policy")) == ["b"]
+
+
+def test_refresh_picks_up_an_index_saved_elsewhere(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    writer = BM25Index(path=path)
+    writer.add("a", "refund policy")
+    writer.save()
+    reader = BM25Index.load(path)
+    assert ids(reader.search("refund")) == ["a"]
+
+    writer.add("b", "invoice audit")
+    writer.remove("a")
+    writer.save()
+    os.utime(path, (reader.loaded_mtime + 1, reader.loaded_mtime + 1))
+    reader.refresh()
+    assert ids(reader.search("refund invoice")) == ["b"]
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolExhaustedError, caller_deadline
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.resets = 0
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    def reset(conn):
+        conn.resets += 1
+
+    return ConnectionPool("test", connect=FakeConnection, ping=lambda conn: None, reset=reset, **kwargs)
+
+
+def test_connections_are_reset_and_reused():
+    pool = make_pool(max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert second is first and first.resets == 2
+    assert pool.stats()["created"] == 1
+
+
+def test_a_discarded_connection_is_closed_not_reused():
+    pool = make_pool(max_size=2)
+    with pool.connection() as conn:
+        pool.discard(conn)
+    assert conn.closed
+    with pool.connection() as other:
+        assert other is not conn
+    assert pool.stats()["discarded"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_a_connection_that_cannot_be_reset_is_closed():
+    def reset(conn):
+        raise RuntimeError("lost connection")
+
+    pool = ConnectionPool("test", connect=FakeConnection, ping=lambda conn: None, reset=reset, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("query failed")
+    assert conn.closed
+    assert pool.stats()["idle"] == 0
+
+
+def test_checkout_waits_no_longer_than_the_callers_deadline():
+    pool = make_pool(max_size=1, checkout_timeout=30)
+    with pool.connection():
+        started = time.monotonic()
+        with caller_deadline(started + 0.1):
+            with pytest.raises(PoolExhaustedError):
+                with pool.connection():
+                    pass
+        assert time.monotonic() - started < 1
+        with pytest.raises(PoolExhaustedError):
+            with pool.connection(timeout=0):
+                pass
+    assert pool.stats()["timeouts"] == 2
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from embedding_service import EmbeddingService, EmbeddingUnavailable
+
+
+class FailingEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        raise ConnectionError("embedding API down")
+
+
+class HangingEmbedder:
+    def embed_documents(self, texts):
+        time.sleep(2)
+        return [[1.0, 0.0] for _ in texts]
+
+
+class WorkingEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_a_failing_api_is_retried_once_then_skipped_for_a_while():
+    embedder = FailingEmbedder()
+    service = EmbeddingService(embedder=embedder, cache_path=":none:", query_retries=1, failure_ttl=60)
+    with pytest.raises(EmbeddingUnavailable):
+        service.embed_query("how many orders")
+    assert embedder.calls == 2
+
+    started = time.monotonic()
+    with pytest.raises(EmbeddingUnavailable):
+        service.embed_query("how many customers")
+    assert time.monotonic() - started < 0.1
+    assert embedder.calls == 2
+    assert service.stats()["fast_failures"] == 1
+
+
+def test_a_hanging_api_is_cut_off_at_the_query_timeout():
+    service = EmbeddingService(embedder=HangingEmbedder(), cache_path=":none:", query_timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(EmbeddingUnavailable):
+        service.embed_query("how many orders")
+    assert time.monotonic() - started < 1
+
+
+def test_ingestion_embeddings_are_cached_on_disk(tmp_path):
+    embedder = WorkingEmbedder()
+    path = str(tmp_path / "embeddings.sqlite3")
+    service = EmbeddingService(embedder=embedder, model="fake", cache_path=path)
+    vectors = service.embed_documents(["a", "bb", "a"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert embedder.calls == 1
+
+    reopened = EmbeddingService(embedder=embedder, model="fake", cache_path=path)
+    assert reopened.embed_query("bb") == [2.0, 1.0]
+    assert embedder.calls == 1
+    assert reopened.stats()["hits"] == 1
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.fakes import HashEmbeddings
+from local_vectorstore import LocalVectorStore
+
+
+@pytest.fixture
+def clustered_store(tmp_path):
+    # 40 well separated clusters of 50 vectors each
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, 32))
+    vectors = np.repeat(centers, 50, axis=0) + rng.normal(scale=0.05, size=(2000, 32))
+    store = LocalVectorStore(HashEmbeddings(latency_ms=0), path=str(tmp_path / "store"), ivf_threshold=10 ** 9)
+    store.add_vectors(vectors, [f"text {i}" for i in range(2000)],
+                      [{"filename": f"doc{i % 2}.pdf"} for i in range(2000)], [f"id{i}" for i in range(2000)])
+    return store, vectors
+
+
+def test_ivf_search_matches_exact_search(clustered_store):
+    store, vectors = clustered_store
+    queries = vectors[::97]
+    exact = store.search_vectors(queries, k=5, exact=True)
+    store.build_ivf(nlist=40)
+    approximate = store.search_vectors(queries, k=5)
+    for exact_hits, approximate_hits in zip(exact, approximate):
+        assert [row for row, _ in approximate_hits] == [row for row, _ in exact_hits]
+        assert np.allclose([score for _, score in approximate_hits], [score for _, score in exact_hits])
+
+
+def test_deleted_and_filtered_rows_are_not_returned(clustered_store):
+    store, vectors = clustered_store
+    store.build_ivf(nlist=40)
+    store.delete(ids=["id0"])
+    for exact in (True, False):
+        rows = [row for row, _ in store.search_vectors(vectors[0], k=5, exact=exact)[0]]
+        assert 0 not in rows
+        rows = [row for row, _ in store.search_vectors(vectors[0], k=5, filter={"filename": "doc1.pdf"},
+                                                       exact=exact)[0]]
+        assert rows and all(row % 2 == 1 for row in rows)
+
+
+def test_persisted_store_searches_the_same(clustered_store):
+    store, vectors = clustered_store
+    store.build_ivf(nlist=40)
+    store.persist()
+    loaded = LocalVectorStore.load(store.embedding, path=store.path)
+    assert loaded.live_count() == 2000
+    assert loaded.search_vectors(vectors[5], k=3)[0] == pytest.approx(store.search_vectors(vectors[5], k=3)[0])
+
+
+def test_refresh_picks_up_a_store_persisted_elsewhere(tmp_path):
+    embedding = HashEmbeddings(latency_ms=0)
+    path = str(tmp_path / "store")
+    writer = LocalVectorStore(embedding, path=path)
+    writer.add_texts(["refund policy for orders", "warehouse shipment"], ids=["a", "b"])
+    writer.persist()
+    reader = LocalVectorStore.load(embedding, path=path)
+    assert reader.similarity_search("refund policy", k=1)[0].page_content == "refund policy for orders"
+
+    writer.delete(ids=["a"])
+    writer.add_texts(["invoice ledger audit"], ids=["c"])
+    writer.persist()
+    meta_path = os.path.join(path, "metadata.json")
+    os.utime(meta_path, (reader.loaded_mtime + 1, reader.loaded_mtime + 1))
+    reader.refresh()
+    texts = [doc.page_content for doc in reader.similarity_search("refund policy", k=5)]
+    assert "refund policy for orders" not in texts
+    assert "invoice ledger audit" in texts
+
+
+def test_a_half_written_store_is_not_loaded(tmp_path):
+    embedding = HashEmbeddings(latency_ms=0)
+    path = str(tmp_path / "store")
+    writer = LocalVectorStore(embedding, path=path)
+    writer.add_texts(["refund policy", "warehouse shipment"], ids=["a", "b"])
+    writer.persist()
+    reader = LocalVectorStore.load(embedding, path=path)
+    # vectors.npy of a newer store, its metadata.json not written yet
+    np.save(os.path.join(path, "vectors.npy"), np.zeros((3, 256), dtype=np.float32))
+    os.utime(os.path.join(path, "metadata.json"), (reader.loaded_mtime + 1, reader.loaded_mtime + 1))
+    reader.refresh()
+    assert reader.live_count() == 2
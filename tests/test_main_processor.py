@@ -0,0 +1,171 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import Error as MySQLError
+
+import db_pool
+from answer_cache import answer_cache
+from db_pool import PoolExhaustedError
+from schema import get_mysql_schema_fingerprint
+from schema_cache import schema_cache
+
+SQL_QUESTION = "How many orders per customer region in the sales table?"
+DOCUMENT_QUESTION = "Summarize the refund policy document"
+
+
+def answer_text(events):
+    return "".join(event["data"]["text"] for event in events if event["event"] == "token")
+
+
+class ExhaustedPool:
+    @contextmanager
+    def connection(self, timeout=None):
+        raise PoolExhaustedError("no connection available")
+        yield
+
+
+class FailingCursor:
+    def execute(self, sql, *args):
+        raise MySQLError(msg="Unknown column 'x' in 'field list'", errno=1054)
+
+    def close(self):
+        pass
+
+
+class FailingPool:
+    @contextmanager
+    def connection(self, timeout=None):
+        class Connection:
+            def cursor(self, *args, **kwargs):
+                return FailingCursor()
+        yield Connection()
+
+
+def replace_pool(monkeypatch, backend, db_config, pool):
+    monkeypatch.setitem(db_pool._pools, db_pool._pool_key(backend, db_config), pool)
+
+
+def test_query_answers_with_every_selected_source(processor, app):
+    response = app.test_client().post("/query", json={"prompt": SQL_QUESTION})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["result"]
+    assert body["answer_cache"] == "miss"
+    assert set(body["source_status"].values()) == {"ok"}
+    assert {"routing", "sources", "summary"} <= set(body["timings_ms"])
+
+    body = app.test_client().post("/query", json={"prompt": SQL_QUESTION}).get_json()
+    assert body["answer_cache"] == "hit"
+
+
+def test_exhausted_pools_do_not_fail_the_request(processor, app, monkeypatch):
+    # Cold schema cache and no connection to read it with
+    monkeypatch.setattr(schema_cache, "entries", {})
+    replace_pool(monkeypatch, "mysql", processor.query_processor.mysql_db_config, ExhaustedPool())
+    replace_pool(monkeypatch, "postgresql", processor.postgresql_processor.postgresql_db_config, ExhaustedPool())
+
+    versions = processor.data_versions()
+    assert versions["mysql"] == versions["postgresql"] == "unknown"
+    response = app.test_client().post("/query", json={"prompt": DOCUMENT_QUESTION})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["source_status"]["mysql"] == body["source_status"]["postgresql"] == "failed"
+    assert answer_cache.stats()["entries"] == 0
+
+
+def test_a_mysql_error_marks_the_source_failed(processor, monkeypatch):
+    db_config = processor.query_processor.mysql_db_config
+    replace_pool(monkeypatch, "mysql", db_config, FailingPool())
+    question = "How many customers are there in each customer region?"
+    details = {}
+    assert processor.process_query(question, {}, details)
+    assert details["source_status"]["mysql"] == "failed"
+    # Neither the partial answer nor the failing SQL is cached
+    assert answer_cache.stats()["entries"] == 0
+    assert processor.query_processor.sql_cache.lookup(get_mysql_schema_fingerprint(db_config), question) is None
+
+
+def test_stream_events(processor):
+    events = list(processor.stream_query(DOCUMENT_QUESTION))
+    kinds = [event["event"] for event in events]
+    assert kinds[0] == "routing"
+    assert "progress" in kinds and "token" in kinds
+    done = events[-1]
+    assert done["event"] == "done" and done["data"]["answer_cache"] == "miss"
+
+    cached = list(processor.stream_query(DOCUMENT_QUESTION))
+    assert [event["event"] for event in cached] == ["token", "done"]
+    assert answer_text(cached) == answer_text(events)
+    assert cached[-1]["data"]["answer_cache"] == "hit"
+
+
+def run_streams(processor, prompt, count):
+    outcomes = {}
+    threads = [threading.Thread(target=lambda i=i: outcomes.setdefault(i, list(processor.stream_query(prompt))))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return list(outcomes.values())
+
+
+def test_identical_streams_share_one_answer(processor, monkeypatch):
+    monkeypatch.setattr(processor.llm, "token_latency_ms", 2)
+    outcomes = run_streams(processor, DOCUMENT_QUESTION, 4)
+    statuses = sorted(events[-1]["data"]["answer_cache"] for events in outcomes)
+    assert statuses == ["coalesced"] * 3 + ["miss"]
+    assert len({answer_text(events) for events in outcomes}) == 1
+
+
+def test_the_leaders_error_reaches_waiting_streams(processor, monkeypatch):
+    monkeypatch.setattr(processor.llm, "token_latency_ms", 2)
+
+    def broken(*args, **kwargs):
+        raise ValueError("context assembly failed")
+
+    monkeypatch.setattr(processor, "summary_inputs", broken)
+    outcomes = run_streams(processor, DOCUMENT_QUESTION, 3)
+    assert all(events[-1] == {"event": "error", "data": {"error": "context assembly failed"}}
+               for events in outcomes)
+    assert answer_cache.stats()["in_flight"] == 0
+
+
+def test_an_abandoned_stream_releases_waiting_requests(processor, monkeypatch):
+    monkeypatch.setattr(processor.llm, "token_latency_ms", 5)
+    leader = processor.stream_query(DOCUMENT_QUESTION)
+    next(leader)
+    status, future = answer_cache.claim(DOCUMENT_QUESTION, processor.data_versions())
+    assert status == "coalesced"
+    leader.close()
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+
+
+def test_a_summary_past_the_deadline_is_an_error(processor, monkeypatch):
+    monkeypatch.setattr(processor.llm, "token_latency_ms", 20)
+    monkeypatch.setattr(processor, "deadline_ms", 600)
+    monkeypatch.setattr(processor, "summary_budget_ms", 300)
+    events = list(processor.stream_query(DOCUMENT_QUESTION))
+    assert events[-1]["event"] == "error"
+    assert "deadline" in events[-1]["data"]["error"]
+    assert answer_cache.stats()["entries"] == 0
+
+
+def test_pool_checkouts_end_at_the_source_deadline(processor, monkeypatch):
+    pool = db_pool.get_mysql_pool(processor.query_processor.mysql_db_config)
+    monkeypatch.setitem(processor.source_budgets_ms, "mysql", 300)
+    slots = []
+    for _ in range(pool.max_size):
+        slots.append(pool.connection())
+        slots[-1].__enter__()
+    try:
+        timings, details = {}, {}
+        processor.process_query("How many orders per region are there?", timings, details)
+    finally:
+        for slot in slots:
+            slot.__exit__(None, None, None)
+    # Given up at the deadline, or failed by the checkout just before it
+    assert details["source_status"]["mysql"] in ("timed_out", "failed")
+    assert timings["mysql"] < 1000
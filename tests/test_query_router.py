@@ -0,0 +1,52 @@
+import pytest
+
+from hybrid_retriever import BM25Index
+from query_router import QueryRouter, word_forms
+
+SCHEMA_TERMS = {
+    "mysql": ({"orders", "customers"}, {"order_id", "customer_id", "region", "amount"}),
+    "postgresql": ({"tickets"}, {"ticket_id", "priority", "opened_at"}),
+}
+
+
+@pytest.fixture
+def bm25_index(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    index.add("policy-1", "Refunds are granted within 30 days under the refund policy.")
+    index.add("policy-2", "The shipping guideline explains carrier choice and delivery windows.")
+    index.add("memo-1", "Quarterly memo on hiring plans and office moves.")
+    return index
+
+
+def test_word_forms():
+    assert word_forms("invoice") == {"invoice", "invoices"}
+    assert word_forms("categories") == {"categories", "category"}
+
+
+def test_sql_question_goes_to_the_matching_backend(bm25_index):
+    routing = QueryRouter().route("What is the total amount of orders per region?", SCHEMA_TERMS, bm25_index)
+    assert routing["mysql"]["selected"]
+    assert not routing["postgresql"]["selected"]
+    assert routing["mysql"]["confidence"] > routing["postgresql"]["confidence"]
+
+
+def test_document_question_goes_to_the_vector_store(bm25_index):
+    routing = QueryRouter().route("Explain the refund policy", SCHEMA_TERMS, bm25_index)
+    assert routing["vector"]["selected"]
+    assert not routing["mysql"]["selected"] and not routing["postgresql"]["selected"]
+
+
+def test_close_sql_backends_both_run(bm25_index):
+    schema_terms = {"mysql": ({"orders"}, {"region"}), "postgresql": ({"orders"}, {"region"})}
+    routing = QueryRouter().route("count orders per region", schema_terms, bm25_index)
+    assert routing["mysql"]["selected"] and routing["postgresql"]["selected"]
+
+
+def test_no_evidence_falls_back_to_the_vector_store(bm25_index):
+    routing = QueryRouter().route("hello there", SCHEMA_TERMS, bm25_index)
+    assert [source for source, choice in routing.items() if choice["selected"]] == ["vector"]
+
+
+def test_without_a_lexical_index_vector_retrieval_stays_on():
+    routing = QueryRouter().route("total amount of orders", SCHEMA_TERMS, None)
+    assert routing["vector"] == {"confidence": 0.5, "selected": True}
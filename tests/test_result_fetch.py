@@ -0,0 +1,55 @@
+import pytest
+
+from result_fetch import fetch_bounded, inject_limit
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t", "SELECT * FROM t\nLIMIT 11"),
+    ("SELECT * FROM t LIMIT 5;", "SELECT * FROM t LIMIT 5"),
+    ("SELECT * FROM t limit 500", "SELECT * FROM t limit 11"),
+    ("SELECT * FROM t LIMIT ALL", "SELECT * FROM t LIMIT 11"),
+    ("SELECT * FROM t LIMIT 500 OFFSET 20", "SELECT * FROM t LIMIT 11 OFFSET 20"),
+    ("SELECT * FROM t LIMIT 20, 500", "SELECT * FROM t LIMIT 20, 11"),
+    ("SELECT * FROM t FETCH FIRST 500 ROWS ONLY", "SELECT * FROM t FETCH FIRST 11 ROWS ONLY"),
+    ("SELECT * FROM t FETCH NEXT ROW ONLY", "SELECT * FROM t FETCH NEXT ROW ONLY"),
+    ("SELECT * FROM t OFFSET 20", "SELECT * FROM t LIMIT 11 OFFSET 20"),
+    ("SELECT * FROM t ORDER BY a FETCH FIRST 5 ROWS WITH TIES",
+     "SELECT * FROM t ORDER BY a FETCH FIRST 5 ROWS WITH TIES"),
+])
+def test_inject_limit(sql, expected):
+    assert inject_limit(sql, 10) == expected
+
+
+def test_inject_limit_ignores_limits_inside_the_query():
+    sql = "SELECT * FROM (SELECT * FROM t LIMIT 500) AS s"
+    assert inject_limit(sql, 10) == sql + "\nLIMIT 11"
+
+
+class ListCursor:
+    description = (("id",), ("name",))
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetched = 0
+
+    def fetchmany(self, size):
+        batch = self.rows[self.fetched:self.fetched + size]
+        self.fetched += len(batch)
+        return batch
+
+
+def test_fetch_bounded_marks_a_result_over_max_rows_as_truncated():
+    cursor = ListCursor((i, f"name {i}") for i in range(100))
+    result = fetch_bounded(cursor, max_rows=10, max_bytes=1024 * 1024, batch_size=4)
+    assert result["columns"] == ["id", "name"]
+    assert result["row_count"] == 10
+    assert result["truncated"]
+    # The rest is left unread for the caller to drop with the connection
+    assert cursor.fetched < 100
+
+
+def test_fetch_bounded_keeps_a_complete_result():
+    result = fetch_bounded(ListCursor((i, "x") for i in range(10)), max_rows=10, max_bytes=1024 * 1024,
+                           batch_size=4)
+    assert result["row_count"] == 10
+    assert not result["truncated"]
@@ -0,0 +1,67 @@
+import sql_cache
+from sql_cache import SQLCache, normalize_question, question_terms
+
+
+def test_normalize_question():
+    assert normalize_question("  How many  Orders?? ") == "how many orders"
+
+
+def test_question_terms_drop_stopwords_and_plurals_but_keep_order():
+    assert question_terms("Show all the orders per region")[0] == ("order", "per", "region")
+    assert question_terms("orders per region")[0] == question_terms("Show all the order per regions?")[0]
+    assert question_terms("customers with most orders")[0] != question_terms("orders with most customers")[0]
+
+
+def test_exact_and_term_hits():
+    cache = SQLCache()
+    cache.store("fp", "How many orders per region?", "SELECT region, COUNT(*) FROM orders GROUP BY region")
+    assert cache.lookup("fp", "how many orders per region") is not None
+    assert cache.lookup("fp", "Show me how many orders there are per regions") is not None
+    assert cache.lookup("other-fp", "How many orders per region?") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["term_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_different_values_miss():
+    cache = SQLCache()
+    cache.store("fp", "total sales in Europe in 2023", "SELECT 1")
+    assert cache.lookup("fp", "total sales in Asia in 2023") is None
+    assert cache.lookup("fp", "total sales in Europe in 2024") is None
+    assert cache.lookup("fp", "total sales in europe in 2023?") == "SELECT 1"
+
+
+def test_stopword_only_questions_never_share_sql():
+    cache = SQLCache()
+    cache.store("fp", "show me all of it", "SELECT 1")
+    assert cache.lookup("fp", "show it all") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SQLCache(max_entries=2)
+    cache.store("fp", "orders per region", "SELECT 1")
+    cache.store("fp", "customers per country", "SELECT 2")
+    assert cache.lookup("fp", "orders per region") == "SELECT 1"
+    cache.store("fp", "invoices per month", "SELECT 3")
+    assert cache.lookup("fp", "customers per country") is None
+    assert cache.lookup("fp", "orders per regions") == "SELECT 1"
+    assert cache.stats()["evictions"] == 1
+    assert len(cache.entries) == len(cache.by_terms) == 2
+
+
+def test_entries_expire(monkeypatch):
+    cache = SQLCache(ttl=60)
+    cache.store("fp", "orders per region", "SELECT 1")
+    now = sql_cache.time.monotonic()
+    monkeypatch.setattr(sql_cache.time, "monotonic", lambda: now + 61)
+    assert cache.lookup("fp", "orders per region") is None
+    assert cache.lookup("fp", "orders per regions") is None
+    assert not cache.entries and not cache.by_terms
+
+
+def test_invalidate_by_fingerprint():
+    cache = SQLCache()
+    cache.store("old", "orders per region", "SELECT 1")
+    cache.store("new", "orders per region", "SELECT 2")
+    cache.invalidate("old")
+    assert cache.lookup("old", "orders per region") is None
+    assert cache.lookup("new", "orders per region") == "SELECT 2"